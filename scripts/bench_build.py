@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Measure how the build scripts scale, on synthetic corpora.
+
+For each --size SPECSxCOMMITS a scratch git repository is created with the
+current scripts/ and a docs/ tree like ours: specs in every component and
+status with metadata tables, stale timeline blocks, previous-versions
+copies, math-heavy chapters, and a history of COMMITS commits editing,
+promoting and renaming them. Then:
+
+- each script is run the way the build runs it, from a clean checkout,
+  --repeat times (validate_metadata.py --check, gen_history.py,
+  gen_rfc_index.py, gen_summary.py, and mdbook-math.py on the book);
+- key functions are timed in this process (gen_history.get_file_commits,
+  mdbook-math transform, spec_header.find_metadata_table and scan_header,
+  gen_rfc_index.parse_doc);
+- the single-pass history walk is checked against per-file
+  `git log --follow`, and last-updated dates against `git log -1`, on a
+  history with copies and merges; any difference makes the script fail.
+
+Results go to a JSON file (default .cache/bench/build-<time>.json), so runs
+can be compared over time.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gen_history
+import gen_rfc_index
+import spec_header
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ROOT / "scripts"
+DEFAULT_SIZES = ["50x100", "200x400", "800x1200"]
+REPO_URL = "https://github.com/vacp2p/rfc-index.git"
+
+# (directory under docs/, status) for new specs, with relative weights.
+PLACES = [
+    ("messaging/standards/core", "stable", 3),
+    ("messaging/standards/application", "draft", 3),
+    ("messaging/informational", "draft", 1),
+    ("messaging/deprecated", "deprecated", 1),
+    ("blockchain/raw", "raw", 4),
+    ("blockchain/deprecated", "deprecated", 1),
+    ("storage/raw", "raw", 2),
+    ("storage/deprecated", "deprecated", 1),
+    ("ift-ts/raw", "raw", 3),
+]
+CATEGORIES = ["Standards Track", "Informational", "Best Current Practice"]
+WORDS = (
+    "node peer message relay store filter protocol shard topic proof key session "
+    "block leader epoch stake commitment nullifier membership gossip payload"
+).split()
+
+
+def load_math():
+    spec = importlib.util.spec_from_file_location("mdbook_math", SCRIPTS / "mdbook-math.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+MATH = load_math()
+
+
+def git(repo: Path, *args: str, env: Optional[Dict[str, str]] = None) -> str:
+    result = subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+    return result.stdout
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def math_section(rng: random.Random) -> List[str]:
+    a, b = rng.sample("abcdefghknpqrxyz", 2)
+    return [
+        f"Each {rng.choice(WORDS)} computes $H({a}_i \\| {b}_i)$ and checks $${a}^2 + {b}^2 = c^2$$ inline.",
+        "",
+        "$$",
+        f"\\sum_{{i=0}}^{{n}} {a}_i \\cdot g^{{{b}_i}} \\equiv \\prod_{{j=1}}^{{k}} \\frac{{{a}_j}}{{{b}_j}} \\pmod p",
+        "$$",
+        "",
+        "$`",
+        f"\\mathsf{{com}} = \\mathrm{{Poseidon}}({a}, {b}, \\rho)",
+        "`$",
+        "",
+        f"Where `{a}` is a field element and ${b} \\in \\mathbb{{F}}_p$.",
+        "",
+    ]
+
+
+def spec_text(rng: random.Random, title: str, slug: Optional[int], status: str, math_heavy: bool) -> str:
+    lines = [
+        f"# {title}",
+        "",
+        "| Field | Value |",
+        "| --- | --- |",
+        f"| Name | {title.title()} |",
+    ]
+    if slug is not None:
+        lines.append(f"| Slug | {slug} |")
+    lines += [
+        f"| Status | {status} |",
+        f"| Category | {rng.choice(CATEGORIES)} |",
+        "| Editor | Jane Doe <jane@example.org> |",
+        "| Contributors | John Roe <john@example.org>, Alex Poe <alex@example.org> |",
+        "",
+    ]
+    if rng.random() < 0.5:
+        lines += [
+            "<!-- timeline:start -->",
+            "",
+            "## Timeline",
+            "",
+            "- **2024-01-01** — [`0000000`](https://github.com/vacp2p/rfc-index/blob/0000000/x.md) — stale",
+            "",
+            "<!-- timeline:end -->",
+            "",
+        ]
+    for section in range(rng.randint(3, 8)):
+        lines += [f"## {sentence(rng, 3)[:-1]}", ""]
+        for _ in range(rng.randint(2, 5)):
+            lines += [sentence(rng, rng.randint(8, 30)), ""]
+        if math_heavy:
+            lines += math_section(rng)
+        elif section % 3 == 0:
+            lines += ["```text", sentence(rng), "```", ""]
+    return "\n".join(lines)
+
+
+def make_corpus(repo: Path, specs: int, commits: int, seed: int) -> None:
+    """Create a git repository at `repo` with `specs` specs and `commits` commits."""
+    rng = random.Random(seed)
+    docs = repo / "docs"
+    shutil.copytree(SCRIPTS, repo / "scripts", ignore=shutil.ignore_patterns("__pycache__"))
+    (repo / ".gitignore").write_text(".cache/\n", encoding="utf-8")
+    docs.mkdir(parents=True)
+    (docs / "README.md").write_text("# Synthetic LIPs\n", encoding="utf-8")
+    for component in {place.split("/")[0] for place, _, _ in PLACES}:
+        (docs / component).mkdir()
+        (docs / component / "README.md").write_text(f"# {component}\n", encoding="utf-8")
+
+    weights = [weight for _, _, weight in PLACES]
+    paths: List[Path] = []
+    for idx in range(specs):
+        place, status, _ = rng.choices(PLACES, weights)[0]
+        name = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{idx}"
+        slug = idx + 1 if status != "raw" else None
+        numbered = place.startswith("messaging/") and slug is not None
+        directory = docs / place / str(slug) if numbered else docs / place
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{name}.md"
+        text = spec_text(rng, name.replace("-", " "), slug, status, math_heavy=rng.random() < 0.3)
+        path.write_text(text, encoding="utf-8")
+        paths.append(path)
+        if numbered and rng.random() < 0.2:
+            old = directory / "previous-versions" / "00" / path.name
+            old.parent.mkdir(parents=True)
+            old.write_text(text, encoding="utf-8")
+
+    git(repo, "init", "-q", "-b", "main")
+    git(repo, "config", "user.name", "Bench")
+    git(repo, "config", "user.email", "bench@example.org")
+    git(repo, "remote", "add", "origin", REPO_URL)
+    day = 0
+
+    def dated() -> Dict[str, str]:
+        nonlocal day
+        day += 1
+        stamp = f"{1_600_000_000 + day * 86400} +0000"
+        return dict(os.environ, GIT_AUTHOR_DATE=stamp, GIT_COMMITTER_DATE=stamp)
+
+    def commit(message: str) -> None:
+        env = dated()
+        git(repo, "add", "-A", env=env)
+        git(repo, "commit", "-q", "--allow-empty", "-m", message, env=env)
+
+    def append(path: Path) -> None:
+        with path.open("a", encoding="utf-8") as handle:
+            handle.write(f"\n{sentence(rng)}\n")
+
+    commit("Add specs")
+    for number in range(1, commits):
+        if rng.random() < 0.05:
+            # A merge keeping the side branch's version of a spec that main
+            # changed later: `git log -1 -- <spec>` then gives the side
+            # branch's date, not main's.
+            path = rng.choice(paths)
+            git(repo, "checkout", "-q", "-b", f"side-{number}")
+            append(path)
+            commit(f"Update a spec on a branch (#{number})")
+            git(repo, "checkout", "-q", "main")
+            append(path)
+            append(rng.choice(paths))
+            commit(f"Update specs on main (#{number})")
+            git(repo, "merge", "-q", "--no-ff", "-X", "theirs", "-m", f"Merge side-{number}", f"side-{number}", env=dated())
+            continue
+        for _ in range(rng.randint(1, 3)):
+            idx = rng.randrange(len(paths))
+            path = paths[idx]
+            roll = rng.random()
+            if roll < 0.05:
+                # Renames exercise `git log --follow`.
+                renamed = path.with_name(f"{path.stem}-v{number}.md")
+                git(repo, "mv", path.relative_to(repo).as_posix(), renamed.relative_to(repo).as_posix())
+                paths[idx] = renamed
+            elif roll < 0.08 and "| Slug |" not in path.read_text(encoding="utf-8"):
+                # A copy to a name sorting before its source, in a commit
+                # that also edits the source: `--follow` lists it once.
+                copy = path.with_name(f"0-{path.stem}-{number}.md")
+                shutil.copyfile(path, copy)
+                append(path)
+                paths.append(copy)
+            elif roll < 0.15:
+                text = path.read_text(encoding="utf-8")
+                path.write_text(text.replace("| Status | draft |", "| Status | stable |"), encoding="utf-8")
+            else:
+                append(path)
+        commit(f"Update specs (#{number})")
+
+
+def reset(repo: Path) -> None:
+    git(repo, "checkout", "-q", "--", ".")
+    git(repo, "clean", "-q", "-fdx", "docs")
+    shutil.rmtree(repo / ".cache", ignore_errors=True)
+
+
+def book_input(repo: Path) -> str:
+    sections = [
+        {"Chapter": {"name": path.stem, "content": path.read_text(encoding="utf-8"), "sub_items": []}}
+        for path in sorted((repo / "docs").rglob("*.md"))
+    ]
+    context = {
+        "root": str(repo),
+        "config": {"preprocessor": {"math": {"chapter-cache": False}}},
+        "renderer": "html",
+    }
+    return json.dumps([context, {"sections": sections}])
+
+
+# (name, script, arguments, whether it reads the book JSON on stdin)
+SCRIPT_RUNS: List[Tuple[str, str, List[str], bool]] = [
+    ("validate_metadata", "validate_metadata.py", ["--check"], False),
+    ("gen_history", "gen_history.py", [], False),
+    ("gen_rfc_index", "gen_rfc_index.py", [], False),
+    ("gen_summary", "gen_summary.py", [], False),
+    ("mdbook-math", "mdbook-math.py", [], True),
+]
+
+
+def time_scripts(repo: Path, repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, script, args, book in SCRIPT_RUNS:
+        runs = []
+        for _ in range(repeat):
+            reset(repo)
+            stdin = book_input(repo) if book else None
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, str(repo / "scripts" / script)] + args,
+                cwd=repo,
+                input=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                encoding="utf-8",
+            )
+            runs.append(time.perf_counter() - start)
+            if result.returncode != 0:
+                raise SystemExit(f"[ERROR] {script} failed in {repo}:\n{result.stderr[-2000:]}")
+        results[name] = {"runs": runs, "best_seconds": min(runs)}
+    return results
+
+
+def time_calls(fn: Callable, inputs: List[Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    for value in inputs:
+        fn(value)
+    seconds = time.perf_counter() - start
+    return {"calls": len(inputs), "seconds": seconds, "per_call": seconds / max(len(inputs), 1)}
+
+
+def time_functions(repo: Path, sample: int) -> Dict[str, Dict[str, Any]]:
+    reset(repo)
+    paths = sorted((repo / "docs").rglob("*.md"))
+    texts = [path.read_text(encoding="utf-8") for path in paths]
+    rels = [path.relative_to(repo).as_posix() for path in paths]
+    results = {
+        "spec_header.find_metadata_table": time_calls(spec_header.find_metadata_table, [t.splitlines() for t in texts]),
+        "spec_header.scan_header": time_calls(spec_header.scan_header, paths),
+        "gen_rfc_index.parse_doc": time_calls(gen_rfc_index.parse_doc, texts),
+        "mdbook-math.transform": time_calls(MATH.transform, texts),
+    }
+    # get_file_commits runs git in the current directory.
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        picked = random.Random(0).sample(rels, min(sample, len(rels)))
+        results["gen_history.get_file_commits"] = time_calls(gen_history.get_file_commits, picked)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def check_history(repo: Path) -> int:
+    """
+    Compare gen_history.walk_history, with the git CLI and with the
+    in-process reader, against per-file `git log --follow` for every spec.
+    Returns the number of differences, which are printed.
+    """
+    mismatches = 0
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        rels = git(repo, "ls-files", "docs/*.md").split()
+        expected = {path: gen_history.get_file_commits(path) for path in rels}
+        for mode in ("cli", "in-process"):
+            if mode == "in-process" and not gen_history.enable_in_process_reader():
+                continue
+            try:
+                history, _ = gen_history.walk_history(rels)
+            finally:
+                gen_history._repository = None
+            for path in rels:
+                walked = [(commit, date, subject, name) for commit, _, date, subject, name in reversed(history[path])]
+                if walked != expected[path]:
+                    print(f"[BENCH] walk_history ({mode}) differs from git log --follow: {path}")
+                    mismatches += 1
+    finally:
+        os.chdir(cwd)
+    return mismatches
+
+
+# Run from the generated repository's scripts/, so that gen_rfc_index
+# reads that repository.
+LAST_UPDATED = """
+import json, sys
+import gen_rfc_index, git_objects
+rels = sys.argv[1:]
+repo = git_objects.open_repository(gen_rfc_index.ROOT)
+print(json.dumps({
+    "cli": gen_rfc_index.get_last_updated_map([gen_rfc_index.ROOT / rel for rel in rels]),
+    "in-process": {rel: gen_rfc_index.last_commit_date_in_process(repo, rel) for rel in rels},
+}))
+"""
+
+
+def check_last_updated(repo: Path) -> int:
+    """
+    Compare gen_rfc_index's last-updated dates, from the streamed walk and
+    from the in-process reader, against `git log -1 -- <spec>` for every
+    spec. Returns the number of differences, which are printed.
+    """
+    rels = git(repo, "ls-files", "docs/*.md").split()
+    output = subprocess.run(
+        [sys.executable, "-c", LAST_UPDATED, *rels],
+        cwd=repo / "scripts",
+        stdout=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    ).stdout
+    mismatches = 0
+    for mode, dates in json.loads(output).items():
+        for rel in rels:
+            expected = git(repo, "log", "-1", "--format=%ad", "--date=short", "--", rel).strip()
+            if dates.get(rel) != expected:
+                print(f"[BENCH] last-updated date ({mode}) of {rel} is {dates.get(rel)}, git log -1 says {expected}")
+                mismatches += 1
+    return mismatches
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    try:
+        specs, commits = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected SPECSxCOMMITS, got {value!r}")
+    if specs < 1 or commits < 1:
+        raise argparse.ArgumentTypeError("SPECS and COMMITS must be at least 1")
+    return specs, commits
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the build scripts on synthetic corpora.")
+    parser.add_argument(
+        "--size",
+        action="append",
+        type=parse_size,
+        help=f"SPECSxCOMMITS; repeat for several (default: {', '.join(DEFAULT_SIZES)}).",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each script (default: %(default)s).")
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=25,
+        help="Specs to time get_file_commits on (default: %(default)s).",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the corpus (default: %(default)s).")
+    parser.add_argument("--output", type=Path, help="JSON results file (default: .cache/bench/build-<time>.json).")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated repositories and print where.")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    args.size = args.size or [parse_size(size) for size in DEFAULT_SIZES]
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    output = args.output or ROOT / ".cache" / "bench" / f"build-{started}.json"
+    head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, stdout=subprocess.PIPE, encoding="utf-8")
+    report: Dict[str, Any] = {
+        "started": started,
+        "commit": head.stdout.strip() or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "sizes": [],
+    }
+
+    mismatches = 0
+    workdir = Path(tempfile.mkdtemp(prefix="bench-build-"))
+    try:
+        for specs, commits in args.size:
+            repo = workdir / f"{specs}x{commits}"
+            print(f"[BENCH] Creating {specs} specs with {commits} commits in {repo}", flush=True)
+            start = time.perf_counter()
+            make_corpus(repo, specs, commits, args.seed)
+            setup = time.perf_counter() - start
+            files = list((repo / "docs").rglob("*.md"))
+            entry = {
+                "specs": specs,
+                "commits": commits,
+                "files": len(files),
+                "bytes": sum(path.stat().st_size for path in files),
+                "setup_seconds": setup,
+                "scripts": time_scripts(repo, args.repeat),
+                "functions": time_functions(repo, args.sample),
+            }
+            report["sizes"].append(entry)
+            mismatches += check_history(repo) + check_last_updated(repo)
+            for name, result in entry["scripts"].items():
+                print(f"[BENCH]   {name:<34} {result['best_seconds']:9.3f}s")
+            for name, result in entry["functions"].items():
+                print(f"[BENCH]   {name:<34} {result['per_call'] * 1000:9.3f}ms x {result['calls']}")
+    finally:
+        if args.keep:
+            print(f"[BENCH] Repositories kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"[BENCH] Wrote {output}")
+    if mismatches:
+        print(f"[BENCH] {mismatches} history or last-updated mismatch(es)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Check and time the mdbook-math.py transform.
+
+Every Markdown file under docs/ is run through both mdbook-math.py and the
+regex implementation it replaced (kept below as the reference); any output
+that differs is reported and makes the script fail. Then both are timed on
+the docs and on inputs built to make the regexes backtrack: unbalanced `$`,
+unclosed `$$` and fences, long backtick runs, many code spans and long
+whitespace after `$`.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "docs"
+
+
+def load_math():
+    spec = importlib.util.spec_from_file_location("mdbook_math", ROOT / "scripts" / "mdbook-math.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+MATH = load_math()
+
+# The previous implementation: protect code, one regex pass per kind of math.
+FENCED_CODE_RE = re.compile(r"```[\s\S]*?```|~~~[\s\S]*?~~~")
+INLINE_CODE_RE = re.compile(r"`+[^`\n]*?`+")
+BLOCK_MATH_RE = re.compile(r"(?<!\\)\$\$(.+?)(?<!\\)\$\$", re.DOTALL)
+INLINE_MATH_RE = re.compile(r"(?<!\\)\$(?!\$)([^\n]*?)(?<!\\)\$")
+ALT_BLOCK_MATH_RE = re.compile(r"(?<!\\)\$`\s*\n(.+?)\n\s*`\$(?!\$)", re.DOTALL)
+
+
+def legacy_transform(content: str) -> str:
+    stores: Dict[str, List[str]] = {}
+
+    def protect(text: str, pattern: re.Pattern, prefix: str) -> str:
+        store = stores.setdefault(prefix, [])
+
+        def repl(match: re.Match) -> str:
+            store.append(match.group(0))
+            return f"{prefix}{len(store) - 1}@@"
+
+        return pattern.sub(repl, text)
+
+    def restore(text: str, prefix: str) -> str:
+        for idx, value in enumerate(stores[prefix]):
+            text = text.replace(f"{prefix}{idx}@@", value)
+        return text
+
+    def render_block(match: re.Match) -> str:
+        encoded = MATH.encode_attr(match.group(1).strip("\n"))
+        return f"<div class=\"math-block\" data-tex=\"{encoded}\"></div>"
+
+    def render_inline(match: re.Match) -> str:
+        encoded = MATH.encode_attr(match.group(1))
+        return f"<span class=\"math-inline\" data-tex=\"{encoded}\"></span>"
+
+    content = protect(content, FENCED_CODE_RE, "@@CODEBLOCK")
+    content = protect(content, INLINE_CODE_RE, "@@INLINECODE")
+    content = ALT_BLOCK_MATH_RE.sub(render_block, content)
+    content = BLOCK_MATH_RE.sub(render_block, content)
+    content = INLINE_MATH_RE.sub(render_inline, content)
+    content = restore(content, "@@INLINECODE")
+    return restore(content, "@@CODEBLOCK")
+
+
+def adversarial(size: int) -> List[Tuple[str, List[str]]]:
+    cases = [
+        ("unbalanced $", "$a " * size),
+        ("unclosed $$", "$$ x " * size),
+        ("unclosed fences", "``` " * size),
+        ("backtick runs", "`" * size + " x\n" + "`` y " * size),
+        ("code spans", "`x` " * size),
+        ("$` whitespace", ("$`" + " \n" * size + "x") * 4),
+        ("mixed", ("$`\n" + "$a `b` " * 8 + "\n") * size),
+    ]
+    return [(name, [text]) for name, text in cases]
+
+
+def timed(fn: Callable[[str], str], texts: List[str], limit: float) -> float:
+    """Best of a few runs over `texts`, stopping once a run takes longer than `limit`."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+        if best > limit:
+            break
+    return best
+
+
+def check_docs(paths: List[Path]) -> int:
+    mismatches = 0
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        if MATH.transform(text) != legacy_transform(text):
+            print(f"[BENCH] Output differs from the reference: {path.relative_to(ROOT)}")
+            mismatches += 1
+    return mismatches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check and time the mdbook-math transform.")
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=500,
+        help="Repetitions in each adversarial input (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--skip-reference",
+        action="store_true",
+        help="Don't time the regex reference on the adversarial inputs (it is quadratic).",
+    )
+    args = parser.parse_args()
+
+    paths = sorted(DOCS.rglob("*.md"))
+    mismatches = check_docs(paths)
+    corpus = [path.read_text(encoding="utf-8") for path in paths]
+    cases = [("docs/", corpus)] + adversarial(args.size)
+
+    print(f"{'input':<18} {'chars':>9} {'scanner':>10} {'reference':>10}")
+    for name, texts in cases:
+        scanner_time = timed(MATH.transform, texts, 5.0)
+        if args.skip_reference and name != "docs/":
+            reference = "-"
+        else:
+            reference = f"{timed(legacy_transform, texts, 5.0):.4f}s"
+        chars = sum(len(text) for text in texts)
+        print(f"{name:<18} {chars:>9} {scanner_time:>9.4f}s {reference:>10}")
+
+    if mismatches:
+        print(f"[BENCH] {mismatches} file(s) differ from the reference")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Run all generators in one process over a single load of the docs/ tree:
+validate -> history -> index -> summary.
+
+The tree is walked and every spec header scanned once (see corpus.py);
+stages read full file contents only when they need them. A stage's module
+is imported when the stage runs. The standalone scripts, and
+run_runtime_generators.py, keep working on their own.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from corpus import Corpus
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "docs"
+
+
+def run_validate(corpus: Corpus) -> None:
+    import validate_metadata
+
+    code = validate_metadata.main([], corpus)
+    if code != 0:
+        raise SystemExit(code)
+
+
+def run_history(corpus: Corpus) -> None:
+    import gen_history
+
+    gen_history.main([], corpus)
+
+
+def run_index(corpus: Corpus) -> None:
+    import gen_rfc_index
+
+    gen_rfc_index.main(["--sharded"], corpus)
+
+
+def run_summary(corpus: Corpus) -> None:
+    import gen_summary
+
+    gen_summary.main([], corpus)
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Corpus], None]
+
+
+STAGES = [
+    Stage("validate", run_validate),
+    Stage("history", run_history),
+    Stage("index", run_index),
+    Stage("summary", run_summary),
+]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the docs generators in-process.")
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=[stage.name for stage in STAGES],
+        metavar="STAGE",
+        help="Run only this stage; repeat for several (default: all, in pipeline order).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    selected = set(args.only or [stage.name for stage in STAGES])
+
+    # gen_history resolves docs/ and runs git relative to the repo root.
+    os.chdir(ROOT)
+    corpus = Corpus(DOCS)
+    print(f"[INFO] Loaded {len(corpus)} Markdown files from {DOCS}")
+
+    for stage in STAGES:
+        if stage.name not in selected:
+            continue
+        print(f"[INFO] Running {stage.name}", flush=True)
+        stage.run(corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared output writing and stage fingerprints for the generators.
+
+`write_if_changed()` is how every generator writes its outputs: atomically,
+and only when the bytes differ, so mdBook does not rebuild for no reason.
+
+`StageCache` fingerprints a generator run from its code (the script and
+the modules it imports from scripts/), its command line and everything it
+declares it reads or writes (see run_runtime_generators.py). The
+fingerprint is taken after the generator has run, so when it still
+matches the next time, running it again would change nothing and the
+generator is skipped. Within one run, each resource is hashed once and
+shared by the generators declaring it; only what a generator writes is
+hashed again after it ran.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import spec_header
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "docs"
+SCRIPTS = ROOT / "scripts"
+DEFAULT_STAGE_CACHE = ROOT / ".cache" / "generators.json"
+STAGE_CACHE_VERSION = 1
+
+# Parts of the docs/ Markdown files, named separately so that generators
+# touching different parts of the same files don't wait on each other.
+DOC_HEADERS = "docs/**/*.md: H1 and metadata table"
+DOC_TIMELINES = "docs/**/*.md: timeline block"
+DOC_BODIES = "docs/**/*.md: body"
+# The commit checked out, for generators that read the git history.
+GIT_HEAD = "git: HEAD"
+
+# Generated Markdown, which is not part of the DOC_* resources.
+GENERATED_DOCS = {DOCS / "SUMMARY.md"}
+
+DOC_RESOURCES = (DOC_HEADERS, DOC_TIMELINES, DOC_BODIES)
+
+TIMELINE_BLOCK = re.compile(r"<!-- timeline:start -->.*?<!-- timeline:end -->", re.DOTALL)
+IMPORT_RE = re.compile(r"^(?:import|from)\s+(\w+)", re.MULTILINE)
+
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """
+    Write `data` to `path` unless it already holds exactly these bytes.
+    The file is replaced in one step, so readers never see a partial file.
+    """
+    if path.is_file() and path.read_bytes() == data:
+        return False
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    if path.exists():
+        shutil.copymode(path, tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+
+def script_digest(script: Path) -> str:
+    """Hash `script` together with the scripts/ modules it imports, recursively."""
+    digest = hashlib.sha256()
+    pending = [script]
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        data = path.read_bytes()
+        digest.update(path.name.encode("utf-8") + b"\0" + data + b"\0")
+        for name in IMPORT_RE.findall(data.decode("utf-8", errors="ignore")):
+            module = SCRIPTS / f"{name}.py"
+            if module.is_file():
+                pending.append(module)
+    return digest.hexdigest()
+
+
+def header_part(path: Path) -> str:
+    header = spec_header.scan_header(path)
+    # scan_header() may read past the table, into the timeline block.
+    end = header.table.end if header.table else len(header.lines)
+    return "\n".join(header.lines[:end])
+
+
+def doc_digests(resources: Iterable[str]) -> Dict[str, str]:
+    """Digests of the given DOC_* resources, reading each Markdown file once."""
+    digests = {resource: hashlib.sha256() for resource in resources}
+    for path in sorted(DOCS.rglob("*.md")):
+        if path in GENERATED_DOCS:
+            continue
+        rel = path.relative_to(ROOT).as_posix()
+        parts: Dict[str, str] = {}
+        if DOC_HEADERS in digests:
+            parts[DOC_HEADERS] = header_part(path)
+        if DOC_TIMELINES in digests or DOC_BODIES in digests:
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            match = TIMELINE_BLOCK.search(text)
+            parts[DOC_TIMELINES] = match.group(0) if match else ""
+            parts[DOC_BODIES] = TIMELINE_BLOCK.sub("", text)
+        for resource, digest in digests.items():
+            digest.update(f"{rel}\0{parts[resource]}\0".encode("utf-8"))
+    return {resource: digest.hexdigest() for resource, digest in digests.items()}
+
+
+def resource_digest(resource: str) -> str:
+    if resource in DOC_RESOURCES:
+        return doc_digests([resource])[resource]
+    digest = hashlib.sha256()
+    if resource == GIT_HEAD:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        digest.update(result.stdout)
+    else:
+        # A file, or a directory when it ends with "/".
+        path = ROOT / resource
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for file_path in files:
+            rel = file_path.relative_to(ROOT).as_posix()
+            data = file_path.read_bytes() if file_path.is_file() else b"missing"
+            digest.update(rel.encode("utf-8") + b"\0" + data + b"\0")
+    return digest.hexdigest()
+
+
+class StageCache:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.stages: Dict[str, str] = {}
+        # Digests of this run, until a generator writes the resource.
+        self.scripts: Dict[Path, str] = {}
+        self.resources: Dict[str, str] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == STAGE_CACHE_VERSION:
+            self.stages = data.get("stages", {})
+
+    def resource(self, resource: str) -> str:
+        if resource not in self.resources:
+            if resource in DOC_RESOURCES:
+                # All of them, while each file is read anyway.
+                missing = [name for name in DOC_RESOURCES if name not in self.resources]
+                self.resources.update(doc_digests(missing))
+            else:
+                self.resources[resource] = resource_digest(resource)
+        return self.resources[resource]
+
+    def changed(self, resources: Iterable[str]) -> None:
+        """Forget the digests of `resources`, which a generator may have written."""
+        for resource in resources:
+            self.resources.pop(resource, None)
+
+    def fingerprint(self, script: Path, args: List[str], resources: Iterable[str]) -> str:
+        if script not in self.scripts:
+            self.scripts[script] = script_digest(script)
+        data = {
+            "script": self.scripts[script],
+            "args": args,
+            "resources": {resource: self.resource(resource) for resource in sorted(resources)},
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def fresh(self, name: str, current: str) -> bool:
+        return self.stages.get(name) == current
+
+    def record(self, name: str, current: Optional[str]) -> None:
+        if current is None:
+            self.stages.pop(name, None)
+        else:
+            self.stages[name] = current
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": STAGE_CACHE_VERSION, "stages": dict(sorted(self.stages.items()))}
+        write_if_changed(self.path, json.dumps(data, indent=2).encode("utf-8"))
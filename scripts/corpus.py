@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+In-memory model of the docs/ tree, shared by the generators when they run
+in one process (see build.py).
+
+The tree is walked once and every Markdown file's header (H1 and metadata
+table) is scanned up front. Full file contents are read only when a stage
+asks for them, and are dropped again when a stage rewrites the file.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import spec_header
+
+
+class Doc:
+    __slots__ = ("path", "rel", "header", "_data")
+
+    def __init__(self, path: Path, rel: Path) -> None:
+        self.path = path
+        self.rel = rel
+        self.header = spec_header.scan_header(path)
+        self._data: Optional[bytes] = None
+
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = self.path.read_bytes()
+        return self._data
+
+    def text(self) -> str:
+        """The file as `Path.read_text(errors="ignore")` returns it."""
+        return self.data().decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class Corpus:
+    """Every `*.md` file under `docs_dir`, in `rglob()` order."""
+
+    def __init__(self, docs_dir: Path) -> None:
+        self.docs_dir = docs_dir
+        self._docs: Dict[Path, Doc] = {}
+        for path in docs_dir.rglob("*.md"):
+            self._docs[path] = Doc(path, path.relative_to(docs_dir))
+
+    def __iter__(self) -> Iterator[Doc]:
+        return iter(list(self._docs.values()))
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def get(self, path: Path) -> Optional[Doc]:
+        return self._docs.get(self._key(path))
+
+    def written(self, path: Path) -> None:
+        """Record that a stage wrote `path`, so later stages see the new contents."""
+        key = self._key(path)
+        if key.suffix == ".md" and key.is_relative_to(self.docs_dir):
+            self._docs[key] = Doc(key, key.relative_to(self.docs_dir))
+
+    def _key(self, path: Path) -> Path:
+        return path if path.is_absolute() else Path.cwd() / path
@@ -1,19 +1,80 @@
 #!/usr/bin/env python3
+import argparse
+import contextlib
+import heapq
+import json
+import os
 import subprocess
-from typing import List, Tuple, Optional, Dict
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, ContextManager, Iterator, List, Tuple, Optional, Dict, Set
 from pathlib import Path
 import re
 
+import git_objects
+import instrument
+import spec_header
+from build_cache import write_if_changed
+
+if TYPE_CHECKING:
+    from corpus import Corpus
+
 VERBOSE = False
 
+DEFAULT_HISTORY_CACHE = Path(".cache/gen_history.json")
+HISTORY_CACHE_VERSION = 1
+
+# (commit, committer timestamp, date, subject, path at commit)
+WalkedCommit = Tuple[str, int, str, str, str]
+# (commit, date, subject, path at commit, committer timestamp, timeline-only)
+CachedCommit = Tuple[str, str, str, str, int, bool]
+
+
+# Per-thread output buffer used by --jobs workers, so their log lines can be
+# replayed in file order.
+_output = threading.local()
+# Caps the number of git subprocesses running at once; None means no cap.
+_git_slots: Optional[threading.BoundedSemaphore] = None
+# In-process object reader used instead of git subprocesses when enabled.
+_repository: Optional[git_objects.Repository] = None
+# Normalized text of blobs, by blob SHA.
+normalized_blobs: Dict[str, str] = {}
+# Timeline-only verdicts decided from patches, by (commit, path).
+timeline_verdicts: Dict[Tuple[str, str], bool] = {}
+
+TIMELINE_BLOCK = re.compile(r"<!-- timeline:start -->.*?<!-- timeline:end -->", re.DOTALL)
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# (old start, old count, new start, new count, changed lines) of a
+# --unified=0 hunk
+Hunk = Tuple[int, int, int, int, List[str]]
+
+
+def emit(line: str):
+    buffer = getattr(_output, "lines", None)
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line, flush=True)
+
 
 def log(msg: str):
-    print(f"[INFO] {msg}", flush=True)
+    emit(f"[INFO] {msg}")
 
 
 def debug(msg: str):
     if VERBOSE:
-        print(f"[DEBUG] {msg}", flush=True)
+        emit(f"[DEBUG] {msg}")
+
+
+def set_git_concurrency(limit: Optional[int]) -> None:
+    global _git_slots
+    _git_slots = threading.BoundedSemaphore(limit) if limit else None
+
+
+def git_slot() -> ContextManager:
+    return _git_slots if _git_slots is not None else contextlib.nullcontext()
 
 
 def run_git(args: list, log_cmd: bool = True) -> str:
@@ -21,16 +82,17 @@ def run_git(args: list, log_cmd: bool = True) -> str:
     if log_cmd:
         debug("Running: " + " ".join(cmd))
 
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        encoding="utf-8",
-    )
+    with git_slot(), instrument.git_call(args):
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+        )
 
     if result.returncode != 0:
-        print("[ERROR] Command failed:", " ".join(cmd))
-        print(result.stderr)
+        emit("[ERROR] Command failed: " + " ".join(cmd))
+        emit(result.stderr)
         raise subprocess.CalledProcessError(
             result.returncode, cmd, result.stdout, result.stderr
         )
@@ -38,54 +100,408 @@ def run_git(args: list, log_cmd: bool = True) -> str:
     return result.stdout.strip()
 
 
+def stream_git(args: list, errors: str = "strict") -> Iterator[str]:
+    """
+    Yield stdout lines of a git command as they are produced, so large
+    outputs (e.g. a repo-wide log) are never buffered in full.
+    """
+    cmd = ["git"] + args
+    debug("Running: " + " ".join(cmd))
+
+    with git_slot(), instrument.git_call(args), tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        assert proc.stdout is not None
+        with proc.stdout:
+            # Decoded per line rather than in text mode, so carriage returns
+            # inside lines are kept as git printed them.
+            for line in proc.stdout:
+                yield line.decode("utf-8", errors=errors).rstrip("\n")
+        returncode = proc.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            err = stderr.read().decode("utf-8", errors="replace")
+            emit("[ERROR] Command failed: " + " ".join(cmd))
+            emit(err)
+            raise subprocess.CalledProcessError(returncode, cmd, None, err)
+
+
 def run_git_optional(args: list) -> Optional[str]:
     cmd = ["git"] + args
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        encoding="utf-8",
-    )
+    with git_slot(), instrument.git_call(args):
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+        )
     if result.returncode != 0:
         return None
     return result.stdout.strip()
 
 
+def universal_newlines(text: str) -> str:
+    """Translate line endings the way reading a text-mode git pipe does."""
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
 def normalize_without_timeline(text: str) -> str:
-    pattern = re.compile(
-        r"<!-- timeline:start -->.*?<!-- timeline:end -->",
-        re.DOTALL,
-    )
-    cleaned = pattern.sub("", text)
+    cleaned = TIMELINE_BLOCK.sub("", text)
     cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
     return cleaned.strip()
 
 
-def get_file_at_commit(commit: str, path: str) -> Optional[str]:
-    return run_git_optional(["show", f"{commit}:{path}"])
+class GitObjectBroker:
+    """
+    A single long-lived `git cat-file --batch-command` process shared by the
+    whole run, replacing one `git show`/`git rev-parse` spawn per lookup.
+
+    Normalized blob text is memoized by blob SHA, so a blob that appears in
+    many commits is only fetched and normalized once. Requests from several
+    threads are serialized on the one process.
+    """
+
+    def __init__(self) -> None:
+        self.proc: Optional[subprocess.Popen] = None
+        self.spawns_saved = 0
+        self.lock = threading.Lock()
+
+    def _request(self, command: str) -> Optional[Tuple[str, str, int]]:
+        if self.proc is None:
+            debug("Starting: git cat-file --batch-command")
+            # Timed until started only; it then serves the whole run.
+            with instrument.git_call(["cat-file", "--batch-command"]):
+                self.proc = subprocess.Popen(
+                    ["git", "cat-file", "--batch-command"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+
+        self.proc.stdin.write(command.encode("utf-8") + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().decode("utf-8").rstrip("\n")
+        if not header:
+            raise RuntimeError(f"git cat-file exited while handling {command!r}")
+
+        parts = header.split(" ")
+        if len(parts) != 3 or not parts[2].isdigit():
+            # "<object> missing" or "<object> ambiguous"
+            return None
+        return parts[0], parts[1], int(parts[2])
+
+    def resolve(self, rev: str) -> Optional[str]:
+        """Return the object id for `rev`, or None if it does not exist."""
+        with self.lock:
+            self.spawns_saved += 1
+            info = self._request(f"info {rev}")
+        return info[0] if info else None
+
+    def read_blob(self, sha: str) -> str:
+        with self.lock:
+            info = self._request(f"contents {sha}")
+            if info is None:
+                raise RuntimeError(f"git cat-file could not read object {sha}")
+            assert self.proc is not None and self.proc.stdout is not None
+            data = self.proc.stdout.read(info[2])
+            self.proc.stdout.read(1)  # trailing newline
+        return data.decode("utf-8", errors="replace")
+
+    def normalized_blob(self, sha: str) -> str:
+        cached = normalized_blobs.get(sha)
+        if cached is None:
+            cached = normalize_without_timeline(universal_newlines(self.read_blob(sha)))
+            normalized_blobs[sha] = cached
+        return cached
+
+    def close(self) -> None:
+        with self.lock:
+            if self.proc is None:
+                return
+            assert self.proc.stdin is not None
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+
+_object_broker: Optional[GitObjectBroker] = None
+_object_broker_lock = threading.Lock()
+
+
+def get_object_broker() -> GitObjectBroker:
+    global _object_broker
+    with _object_broker_lock:
+        if _object_broker is None:
+            _object_broker = GitObjectBroker()
+    return _object_broker
+
+
+def enable_in_process_reader() -> bool:
+    global _repository
+    try:
+        _repository = git_objects.find_repository(Path.cwd())
+    except git_objects.UnsupportedRepository as exc:
+        log(f"In-process git reader unavailable ({exc}); using the git CLI")
+        return False
+    debug(f"Reading git objects in-process from {_repository.git_dir}")
+    return True
+
+
+def disable_in_process_reader(exc: Exception) -> None:
+    global _repository
+    if _repository is not None:
+        log(f"In-process git reader failed ({exc}); falling back to the git CLI")
+    _repository = None
+
+
+def is_timeline_only_change_in_process(repo: git_objects.Repository, commit: str, path: str) -> bool:
+    current_commit = repo.commit(commit)
+    current = repo.entry_at(current_commit.tree, path)
+    if current is None or not current_commit.parents:
+        return False
+
+    parent = repo.entry_at(repo.commit(current_commit.parents[0]).tree, path)
+    if parent is None:
+        return False
+
+    if current.sha == parent.sha:
+        return True
+    texts = []
+    for entry in (current, parent):
+        if entry.is_tree:
+            raise git_objects.UnsupportedRepository(f"{path} is a directory at {commit}")
+        text = normalized_blobs.get(entry.sha)
+        if text is None:
+            text = repo.blob(entry.sha).decode("utf-8", errors="replace")
+            text = normalize_without_timeline(universal_newlines(text))
+            normalized_blobs[entry.sha] = text
+        texts.append(text)
+    return texts[0] == texts[1]
 
 
 def is_timeline_only_change(commit: str, path: str) -> bool:
-    current = get_file_at_commit(commit, path)
+    verdict = timeline_verdicts.get((commit, path))
+    if verdict is not None:
+        return verdict
+
+    repo = _repository
+    if repo is not None:
+        try:
+            return is_timeline_only_change_in_process(repo, commit, path)
+        except git_objects.UnsupportedRepository as exc:
+            disable_in_process_reader(exc)
+
+    broker = get_object_broker()
+    current = broker.resolve(f"{commit}:{path}")
     if current is None:
         return False
 
-    parent = run_git_optional(["rev-parse", f"{commit}^"])
+    parent = broker.resolve(f"{commit}^")
     if parent is None:
         return False
 
-    parent_text = get_file_at_commit(parent, path)
-    if parent_text is None:
+    parent_blob = broker.resolve(f"{parent}:{path}")
+    if parent_blob is None:
         return False
 
-    return normalize_without_timeline(current) == normalize_without_timeline(parent_text)
+    if current == parent_blob:
+        return True
+    return broker.normalized_blob(current) == broker.normalized_blob(parent_blob)
+
+
+def find_timeline_spans(text: str) -> List[Tuple[int, int]]:
+    """Return the (first, last) line numbers of each timeline block in `text`."""
+    return [
+        (text.count("\n", 0, match.start()) + 1, text.count("\n", 0, match.end()) + 1)
+        for match in TIMELINE_BLOCK.finditer(text)
+    ]
+
+
+def hunk_inside(start: int, count: int, span: Tuple[int, int]) -> bool:
+    first, last = span
+    if count == 0:
+        # Pure insertion/deletion after line `start`.
+        return first <= start < last
+    return first < start and start + count - 1 < last
+
+
+def hunk_near(start: int, count: int, span: Tuple[int, int]) -> bool:
+    first, last = span
+    end = start + count - 1 if count else start + 1
+    return start <= last + 1 and end >= first - 1
+
+
+class TimelinePatchClassifier:
+    """
+    Decides which commits only touched the timeline block of a file from one
+    `git log -p --unified=0` stream, instead of reading the full text of the
+    file before and after every commit.
+
+    A change is timeline-only when every hunk lies inside a timeline block on
+    both sides of the diff. The line spans of the blocks are read once for
+    the newest version of a file and then carried back through each patch,
+    so older versions are only fetched where the history is not linear.
+    Hunks that touch a marker, only change whitespace or sit next to a block
+    stay undecided and are left to the full-text comparison.
+    """
+
+    def __init__(self) -> None:
+        # Timeline block spans, by blob SHA.
+        self.spans: Dict[str, List[Tuple[int, int]]] = {}
+        self.verdicts: Dict[Tuple[str, str], bool] = {}
+        self.blobs_read = 0
+        self.undecided = 0
+
+    def blob_spans(self, sha: str) -> List[Tuple[int, int]]:
+        spans = self.spans.get(sha)
+        if spans is None:
+            text = None
+            if _repository is not None:
+                try:
+                    text = _repository.blob(sha).decode("utf-8", errors="replace")
+                except git_objects.UnsupportedRepository as exc:
+                    disable_in_process_reader(exc)
+            if text is None:
+                text = get_object_broker().read_blob(sha)
+            self.blobs_read += 1
+            spans = find_timeline_spans(text)
+            self.spans[sha] = spans
+        return spans
+
+    def classify_patch(self, old_sha: str, new_sha: str, hunks: List[Hunk]) -> Optional[bool]:
+        if old_sha == new_sha:
+            return True
+        if not old_sha.strip("0") or not new_sha.strip("0"):
+            # Added or deleted: the file is missing on one side.
+            return False
+        if any("<!-- timeline:" in line or "\r" in line for hunk in hunks for line in hunk[4]):
+            # Marker edits, and line endings that are normalized before the
+            # full-text comparison.
+            return None
+
+        new_spans = self.blob_spans(new_sha)
+        old_spans = []
+        for span in new_spans:
+            # No marker line changed, so each block only moves by the lines
+            # added or removed above it.
+            shift = [
+                old_count - new_count
+                for _, old_count, new_start, new_count, _ in hunks
+                if (new_start + new_count - 1 if new_count else new_start) < span[0]
+            ]
+            old_spans.append((span[0] + sum(shift), span[1] + sum(shift)))
+        self.spans.setdefault(old_sha, old_spans)
+
+        verdict: Optional[bool] = True
+        for old_start, old_count, new_start, new_count, lines in hunks:
+            if any(
+                hunk_inside(new_start, new_count, new_span) and hunk_inside(old_start, old_count, old_span)
+                for new_span, old_span in zip(new_spans, old_spans)
+            ):
+                continue
+            removed = [line[1:].strip() for line in lines if line.startswith("-") and line[1:].strip()]
+            added = [line[1:].strip() for line in lines if line.startswith("+") and line[1:].strip()]
+            if (
+                removed == added
+                or any(hunk_near(new_start, new_count, span) for span in new_spans)
+                or any(hunk_near(old_start, old_count, span) for span in old_spans)
+            ):
+                # Only whitespace changed, or the hunk borders a block: blank
+                # lines are collapsed and the text stripped before comparing,
+                # so this may still normalize away.
+                verdict = None
+                continue
+            return False
+        return verdict
+
+    def classify(self, revision: Optional[str] = None) -> Dict[Tuple[str, str], bool]:
+        args = [
+            "log", "-p", "--unified=0", "--full-index", "--no-renames",
+            "--no-ext-diff", "--no-color", "--full-history", "--format=%x00%H",
+        ]
+        if revision:
+            args.append(revision)
+        args += ["--", "*.md"]
+
+        commit = path = old_sha = new_sha = None
+        hunks: List[Hunk] = []
+        decidable = True
+
+        def flush() -> None:
+            if commit is None or path is None:
+                return
+            verdict = None
+            if decidable and old_sha is not None and new_sha is not None:
+                verdict = self.classify_patch(old_sha, new_sha, hunks)
+            if verdict is None:
+                self.undecided += 1
+            else:
+                self.verdicts[(commit, path)] = verdict
+
+        for line in stream_git(args, errors="replace"):
+            if line.startswith("\x00"):
+                flush()
+                commit, path = line[1:], None
+            elif line.startswith("diff --git "):
+                flush()
+                names = line[len("diff --git "):]
+                # "a/<path> b/<path>"; quoted (unusual) paths are left undecided.
+                path = names[2:(len(names) - 1) // 2] if not names.startswith('"') else None
+                old_sha = new_sha = None
+                hunks = []
+                decidable = True
+            elif path is None:
+                continue
+            elif hunks and line[:1] in ("+", "-", "\\"):
+                hunks[-1][4].append(line)
+            elif line.startswith("@@"):
+                match = HUNK_HEADER.match(line)
+                if match is None:
+                    decidable = False
+                    continue
+                old_start, old_count, new_start, new_count = match.groups()
+                hunks.append((
+                    int(old_start),
+                    int(old_count) if old_count is not None else 1,
+                    int(new_start),
+                    int(new_count) if new_count is not None else 1,
+                    [],
+                ))
+            elif line.startswith("index "):
+                blobs = line.split(" ")[1].split("..")
+                if len(blobs) == 2:
+                    old_sha, new_sha = blobs
+            elif line.startswith("old mode "):
+                # Mode-only changes have no index line.
+                old_sha = new_sha = ""
+            elif line.startswith("Binary files "):
+                decidable = False
+        flush()
+        return self.verdicts
+
+
+def classify_timeline_patches(revision: Optional[str] = None) -> None:
+    classifier = TimelinePatchClassifier()
+    verdicts = classifier.classify(revision)
+    timeline_verdicts.update(verdicts)
+    log(
+        f"Classified {len(verdicts)} file changes from patches "
+        f"({sum(verdicts.values())} timeline-only, {classifier.undecided} left to full-text comparison, "
+        f"{classifier.blobs_read} blobs read)"
+    )
 
 
 def get_repo_https_url() -> Optional[str]:
-    try:
-        url = run_git(["config", "--get", "remote.origin.url"]).strip()
-    except subprocess.CalledProcessError:
-        return None
+    url = _repository.config_value("remote", "origin", "url") if _repository is not None else None
+    if url is None:
+        try:
+            url = run_git(["config", "--get", "remote.origin.url"]).strip()
+        except subprocess.CalledProcessError:
+            return None
 
     if url.startswith("git@github.com:"):
         path = url[len("git@github.com:"):]
@@ -117,6 +533,62 @@ def get_repo_file_path(path: str) -> str:
     return resolved
 
 
+def get_repo_file_paths(paths: List[str]) -> Dict[str, str]:
+    """
+    Resolve many working-tree paths at once with a single `git ls-files`.
+    Returns a mapping of each given path to its path inside the repo.
+    """
+    repo = _repository
+    if repo is not None:
+        try:
+            resolved_in_process = resolve_paths_in_process(repo, paths)
+        except git_objects.UnsupportedRepository as exc:
+            disable_in_process_reader(exc)
+        else:
+            if resolved_in_process is not None:
+                return resolved_in_process
+
+    debug(f"Resolving {len(paths)} file paths via git")
+    prefix = run_git(["rev-parse", "--show-prefix"], log_cmd=False)
+    tracked = set(run_git(["ls-files", "--full-name", "--"] + paths, log_cmd=False).splitlines())
+
+    resolved: Dict[str, str] = {}
+    for path in paths:
+        repo_path = (Path(prefix) / path).as_posix() if prefix else Path(path).as_posix()
+        if repo_path not in tracked:
+            raise SystemExit(f"[ERROR] {path!r} is not tracked by git")
+        resolved[path] = repo_path
+    return resolved
+
+
+def resolve_paths_in_process(repo: git_objects.Repository, paths: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Resolve paths against the tree at HEAD. Returns None if any path is not
+    committed yet, so the caller can ask `git ls-files` about the index.
+    """
+    try:
+        prefix = Path.cwd().resolve().relative_to(repo.root.resolve())
+    except ValueError:
+        return None
+
+    tree = repo.commit(repo.head()).tree
+    resolved: Dict[str, str] = {}
+    for path in paths:
+        repo_path = (prefix / path).as_posix()
+        entry = repo.entry_at(tree, repo_path)
+        if entry is None or entry.is_tree:
+            return None
+        resolved[path] = repo_path
+    return resolved
+
+
+def parse_commit_line(line: str, fields: int = 3) -> Optional[Tuple[str, ...]]:
+    parts = line.split("\t", fields - 1)
+    if len(parts) == fields and len(parts[0]) >= 7 and all(c in "0123456789abcdef" for c in parts[0].lower()):
+        return tuple(parts)
+    return None
+
+
 def get_file_commits(path: str) -> List[Tuple[str, str, str, str]]:
     debug(f"Collecting commit history for: {path}")
 
@@ -139,12 +611,12 @@ def get_file_commits(path: str) -> List[Tuple[str, str, str, str]]:
     for line in log_output.splitlines():
         if not line.strip():
             continue
-        parts = line.split("\t", 2)
         # Detect commit line
-        if len(parts) == 3 and len(parts[0]) >= 7 and all(c in "0123456789abcdef" for c in parts[0].lower()):
+        header = parse_commit_line(line)
+        if header:
             if current:
                 commits.append((current["commit"], current["date"], current["subject"], current.get("path", path)))
-            current = {"commit": parts[0], "date": parts[1], "subject": parts[2]}
+            current = {"commit": header[0], "date": header[1], "subject": header[2]}
             continue
 
         # If we are in a commit block and we see a path, record the first one
@@ -159,6 +631,310 @@ def get_file_commits(path: str) -> List[Tuple[str, str, str, str]]:
     return commits
 
 
+def walk_history(
+    paths: List[str],
+    revision: Optional[str] = None,
+) -> Tuple[Dict[str, List[WalkedCommit]], Dict[str, str]]:
+    """
+    Collect the history of many files from one streamed, repo-wide
+    `git log --name-status --find-copies-harder`, tracking renames the way
+    `--follow` does.
+
+    `git log --follow` does not prune the walk by pathspec and never reports
+    merges, so walking the whole repository in default order and switching a
+    file to its old name at the commit that renamed or copied it reproduces
+    the per-file output. `--follow` looks for the source of a file that
+    appears with rename and copy detection against every file of the parent,
+    which is what --find-copies-harder does for the whole commit, so the
+    source is read from the same `R`/`C` record. The walk is not limited to
+    docs/ so that specs moved into docs/ from elsewhere keep their earlier
+    history.
+
+    Returns each file's commits newest first, and the name each file had
+    where the walk stopped.
+    """
+    if _repository is not None:
+        try:
+            return walk_history_in_process(_repository, paths, revision)
+        except git_objects.UnsupportedRepository as exc:
+            disable_in_process_reader(exc)
+
+    debug(f"Collecting commit history for {len(paths)} files in a single pass")
+
+    history: Dict[str, List[WalkedCommit]] = {path: [] for path in paths}
+    # Name of each followed file at the point of the walk -> files following it.
+    following: Dict[str, List[str]] = {}
+    for path in paths:
+        following.setdefault(path, []).append(path)
+
+    args = [
+        "log",
+        "--format=%H%x09%ct%x09%ad%x09%s",
+        "--date=short",
+        "--name-status",
+        "--find-copies-harder",
+    ]
+    if revision:
+        args.append(revision)
+
+    header: Optional[Tuple[str, ...]] = None
+    # Files that already have the current commit. One switched to its source
+    # at an `A` line must not get the commit again from a later line of the
+    # same commit that changes the source.
+    recorded: Set[str] = set()
+    for line in stream_git(args):
+        if not line.strip():
+            continue
+        commit_header = parse_commit_line(line, fields=4)
+        if commit_header:
+            header = commit_header
+            recorded = set()
+            continue
+        if header is None:
+            continue
+
+        parts = line.split("\t")
+        status = parts[0]
+        new_path = parts[-1]
+        source = parts[1] if status[:1] in ("R", "C") and len(parts) == 3 else None
+        old_path = source if status.startswith("R") else None
+        commit, timestamp, date, subject = header
+
+        if old_path:
+            # Files following the source of a rename see it as deleted.
+            for target in following.get(old_path, []):
+                if target not in recorded:
+                    recorded.add(target)
+                    history[target].append((commit, int(timestamp), date, subject, old_path))
+
+        targets = following.get(new_path)
+        if not targets:
+            continue
+
+        for target in targets:
+            if target not in recorded:
+                recorded.add(target)
+                history[target].append((commit, int(timestamp), date, subject, new_path))
+
+        if source:
+            # The followed file appeared here; --follow continues with
+            # whatever it was renamed or copied from.
+            del following[new_path]
+            following.setdefault(source, []).extend(targets)
+
+    names = {target: name for name, targets in following.items() for target in targets}
+    return history, names
+
+
+def get_follow_source(commit: str, path: str) -> Optional[str]:
+    """
+    Ask git which file `commit` renamed or copied to `path`, the way
+    `--follow` does: with copy detection against every file of the parent.
+    """
+    output = run_git(["log", "-1", "--follow", "--name-status", "--format=", commit, "--", path])
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if parts[0][:1] in ("R", "C") and len(parts) == 3 and parts[2] == path:
+            return parts[1]
+    return None
+
+
+def get_follow_source_in_process(
+    repo: git_objects.Repository,
+    parent: str,
+    commit: git_objects.Commit,
+    path: str,
+) -> Optional[str]:
+    """
+    Same as get_follow_source. Exact renames and copies are matched
+    in-process; inexact ones need git's similarity scoring, so they are
+    still asked from git.
+    """
+    added = repo.entry_at(commit.tree, path)
+    if added is not None:
+        source = repo.find_identical_source(repo.commit(parent).tree, commit.tree, path, added)
+        if source:
+            return source
+    return get_follow_source(commit.sha, path)
+
+
+def walk_history_in_process(
+    repo: git_objects.Repository,
+    paths: List[str],
+    revision: Optional[str] = None,
+) -> Tuple[Dict[str, List[WalkedCommit]], Dict[str, str]]:
+    """Same as walk_history, reading commits and trees with the in-process reader."""
+    debug(f"Collecting commit history for {len(paths)} files in-process")
+
+    history: Dict[str, List[WalkedCommit]] = {path: [] for path in paths}
+    following: Dict[str, List[str]] = {}
+    for path in paths:
+        following.setdefault(path, []).append(path)
+
+    if revision and ".." in revision:
+        start, end = revision.split("..", 1)
+        include, exclude = [end or repo.head()], [start]
+    else:
+        include, exclude = [revision or repo.head()], []
+
+    for commit in repo.walk(include, exclude):
+        if len(commit.parents) > 1:
+            continue  # git log shows no changes for merges
+        parent = commit.parents[0] if commit.parents else None
+        parent_tree = repo.commit(parent).tree if parent else None
+
+        changes = {
+            path: (before, after)
+            for path, before, after in repo.diff_trees(parent_tree, commit.tree)
+        }
+        touched = [name for name in changes if name in following]
+        if not touched:
+            continue
+
+        renames: Dict[str, str] = {}
+        for name in touched:
+            for target in following[name]:
+                history[target].append((commit.sha, commit.committer_time, commit.author_date, commit.subject, name))
+            if parent and changes[name][0] is None:
+                source = get_follow_source_in_process(repo, parent, commit, name)
+                if source:
+                    renames[name] = source
+
+        for name, source in renames.items():
+            targets = following.pop(name)
+            following.setdefault(source, []).extend(targets)
+
+    names = {target: name for name, targets in following.items() for target in targets}
+    return history, names
+
+
+def get_all_file_commits(paths: List[str]) -> Dict[str, List[Tuple[str, str, str, str]]]:
+    history, _ = walk_history(paths)
+    result: Dict[str, List[Tuple[str, str, str, str]]] = {}
+    for path, walked in history.items():
+        result[path] = [(commit, date, subject, path_at_commit) for commit, _, date, subject, path_at_commit in reversed(walked)]
+        debug(f"Found {len(walked)} commits for {path}.")
+    return result
+
+
+def classify_walked_commits(walked: List[WalkedCommit]) -> List[CachedCommit]:
+    return [
+        (commit, date, subject, path_at_commit, timestamp, is_timeline_only_change(commit, path_at_commit))
+        for commit, timestamp, date, subject, path_at_commit in walked
+    ]
+
+
+def get_head() -> str:
+    if _repository is not None:
+        try:
+            return _repository.head()
+        except git_objects.UnsupportedRepository as exc:
+            disable_in_process_reader(exc)
+    return run_git(["rev-parse", "HEAD"])
+
+
+def is_ancestor(ancestor: str, descendant: str) -> bool:
+    if _repository is not None:
+        try:
+            return _repository.is_ancestor(ancestor, descendant)
+        except git_objects.UnsupportedRepository as exc:
+            disable_in_process_reader(exc)
+    return run_git_optional(["merge-base", "--is-ancestor", ancestor, descendant]) is not None
+
+
+def is_shallow_repository() -> bool:
+    if _repository is not None:
+        return _repository.is_shallow()
+    return run_git_optional(["rev-parse", "--is-shallow-repository"]) == "true"
+
+
+def load_history_cache(cache_path: Path) -> Optional[Dict]:
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != HISTORY_CACHE_VERSION:
+        return None
+    return data
+
+
+def save_history_cache(cache_path: Path, tip: str, files: Dict[str, List[CachedCommit]]) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "version": HISTORY_CACHE_VERSION,
+        "tip": tip,
+        "files": {path: [list(entry) for entry in entries] for path, entries in sorted(files.items())},
+    }
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+
+
+def get_cached_file_commits(
+    paths: List[str],
+    cache_path: Path,
+    patch_classifier: bool = False,
+) -> Dict[str, List[Tuple[str, str, str, str]]]:
+    """
+    Return the timeline-filtered history of each file, walking only the
+    commits between the cached tip and HEAD.
+
+    The cache keeps every file's commits (oldest first) keyed by its path at
+    the cached tip, together with the timeline-only verdict of each commit.
+    New commits are walked with rename tracking back to the tip, so a file
+    renamed since then picks up the history cached under its old name.
+    If the tip is no longer an ancestor of HEAD the history was rewritten
+    and everything is rebuilt. With `patch_classifier` the new commits are
+    classified from their patches first.
+    """
+    head = get_head()
+    cache = load_history_cache(cache_path)
+    tip = cache.get("tip") if cache else None
+
+    if cache and tip and not is_ancestor(tip, head):
+        log(f"History cache tip {str(tip)[:7]} is not an ancestor of HEAD (rewritten or not fetched); rebuilding")
+        cache = None
+
+    if patch_classifier:
+        classify_timeline_patches(f"{tip}..{head}" if cache else None)
+
+    cached: Dict[str, List[CachedCommit]] = {}
+    if cache is None:
+        if is_shallow_repository():
+            log("[WARN] Shallow clone without a usable history cache; timelines will be truncated")
+        walked, names = walk_history(paths)
+    else:
+        walked, names = walk_history(paths, f"{tip}..{head}")
+        cached = {
+            path: [tuple(entry) for entry in entries]  # type: ignore[misc]
+            for path, entries in cache.get("files", {}).items()
+        }
+        missing = sorted({names[path] for path in paths if names[path] not in cached})
+        if missing:
+            # Not known at the tip (e.g. a new spec reusing an old name):
+            # continue their --follow walk from the tip.
+            debug(f"Walking history from {tip[:7]} for {len(missing)} uncached files")
+            extra, _ = walk_history(missing, tip)
+            for name, entries in extra.items():
+                cached[name] = list(reversed(classify_walked_commits(entries)))
+        log(f"History cache hit at {tip[:7]}; walked {head[:7]} back to it")
+
+    files: Dict[str, List[CachedCommit]] = {}
+    for path in paths:
+        new_commits = classify_walked_commits(walked[path])
+        old_commits = reversed(cached.get(names[path], []))
+        merged = list(heapq.merge(new_commits, old_commits, key=lambda entry: -entry[4]))
+        merged.reverse()
+        files[path] = merged
+
+    save_history_cache(cache_path, head, files)
+
+    return {
+        path: [(commit, date, subject, path_at_commit) for commit, date, subject, path_at_commit, _, timeline_only in entries if not timeline_only]
+        for path, entries in files.items()
+    }
+
+
 def filter_timeline_commits(
     commits: List[Tuple[str, str, str, str]]
 ) -> List[Tuple[str, str, str, str]]:
@@ -240,7 +1016,7 @@ def inject_timeline(file_path: Path, timeline_md: str) -> bool:
             new_content,
         )
         if count and new_content != content:
-            file_path.write_text(new_content, encoding="utf-8")
+            write_if_changed(file_path, new_content.encode("utf-8"))
             return True
         return False
 
@@ -262,28 +1038,31 @@ def inject_timeline(file_path: Path, timeline_md: str) -> bool:
         new_content,
     )
     if new_content != content:
-        file_path.write_text(new_content, encoding="utf-8")
+        write_if_changed(file_path, new_content.encode("utf-8"))
         return True
     return False
 
 
+def is_rfc_header(header: spec_header.SpecHeader) -> bool:
+    return header.title is not None and header.table is not None
+
+
 def is_rfc_file(path: Path) -> bool:
     try:
-        text = path.read_text(encoding="utf-8", errors="ignore")
+        header = spec_header.scan_header(path)
     except OSError:
         return False
-
-    if "# " not in text:
-        return False
-
-    if "| Field | Value |" not in text:
-        return False
-
-    return True
+    return is_rfc_header(header)
 
 
-def find_rfc_files(root: Path) -> List[Path]:
+def find_rfc_files(root: Path, corpus: Optional["Corpus"] = None) -> List[Path]:
     candidates: List[Path] = []
+    if corpus is not None:
+        for doc in corpus:
+            if doc.path.name not in {"README.md", "SUMMARY.md", "template.md"} and is_rfc_header(doc.header):
+                candidates.append(root / doc.rel)
+        return sorted(candidates)
+
     for path in root.rglob("*.md"):
         if path.name in {"README.md", "SUMMARY.md", "template.md"}:
             continue
@@ -292,9 +1071,126 @@ def find_rfc_files(root: Path) -> List[Path]:
     return sorted(candidates)
 
 
-def main():
+def update_file_timeline(
+    file_path: Path,
+    repo_url: str,
+    history: Optional[Dict[str, List[Tuple[str, str, str, str]]]],
+    repo_file_paths: Dict[str, str],
+    filter_commits: bool,
+) -> bool:
+    """
+    Resolve, log, filter and inject the timeline of one file.
+    Returns True if the file was modified.
+    """
+    if history is not None:
+        repo_file_path = repo_file_paths[str(file_path)]
+        commits = history[repo_file_path]
+    else:
+        repo_file_path = get_repo_file_path(str(file_path))
+        commits = get_file_commits(repo_file_path)
+    if filter_commits:
+        commits = filter_timeline_commits(commits)
+    if not commits:
+        debug(f"[WARN] No history found for {repo_file_path}")
+        return False
+
+    markdown = build_markdown_history(
+        repo_url=repo_url,
+        file_path=repo_file_path,
+        commits=commits,
+    )
+
+    modified = inject_timeline(file_path, markdown)
+    if modified:
+        debug(f"Timeline injected into {file_path}")
+    return modified
+
+
+def run_buffered(fn: Callable[[], bool]) -> Tuple[Optional[bool], List[str], Optional[BaseException]]:
+    """
+    Run `fn` with its log output captured instead of printed.
+    Returns its result, the captured lines and the exception it raised, if any.
+    """
+    lines: List[str] = []
+    _output.lines = lines
+    try:
+        return fn(), lines, None
+    except BaseException as exc:
+        return None, lines, exc
+    finally:
+        _output.lines = None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate timelines for LIPs from git history.")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        metavar="FILE",
+        help="Only update the timelines of these files (default: every spec under docs/).",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Read the history of all files from one streamed repo-wide git log.",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_HISTORY_CACHE,
+        help=(
+            "Keep an incremental history cache at this path "
+            f"(default: {DEFAULT_HISTORY_CACHE}) and only walk commits added since the last run."
+        ),
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help=(
+            "Read commits, trees and blobs in-process instead of spawning git "
+            "(implies --single-pass; falls back to the git CLI when needed)."
+        ),
+    )
+    parser.add_argument(
+        "--patch-classifier",
+        action="store_true",
+        help=(
+            "Detect timeline-only commits from one `git log -p --unified=0` stream, "
+            "comparing full file text only for ambiguous changes."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to process concurrently (default: 1).",
+    )
+    parser.add_argument(
+        "--max-git-procs",
+        type=int,
+        help="Maximum number of git subprocesses running at once (default: --jobs).",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.max_git_procs is not None and args.max_git_procs < 1:
+        parser.error("--max-git-procs must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None, corpus: Optional["Corpus"] = None):
+    """
+    Run the generator. With a `corpus` (see build.py) files are found from
+    its scanned headers, and files that get a new timeline are reported to it.
+    """
+    args = parse_args(argv)
     log("Starting history generation")
 
+    if args.in_process:
+        enable_in_process_reader()
+
     repo_url = get_repo_https_url()
     if not repo_url:
         raise SystemExit("[ERROR] Could not determine GitHub repo URL")
@@ -302,32 +1198,74 @@ def main():
     log(f"Repo URL: {repo_url}")
 
     root = Path("docs")
-    files = find_rfc_files(root)
+    files = find_rfc_files(root, corpus)
     if not files:
         raise SystemExit(f"[ERROR] No LIPs found under {root}")
-
-    updated = 0
-    for file_path in files:
-        repo_file_path = get_repo_file_path(str(file_path))
-        commits = get_file_commits(repo_file_path)
-        commits = filter_timeline_commits(commits)
-        if not commits:
-            debug(f"[WARN] No history found for {repo_file_path}")
-            continue
-
-        markdown = build_markdown_history(
-            repo_url=repo_url,
-            file_path=repo_file_path,
-            commits=commits,
+    if args.files:
+        wanted = {file_path.resolve() for file_path in args.files}
+        files = [file_path for file_path in files if file_path.resolve() in wanted]
+        if not files:
+            log("None of the given files are LIPs")
+            return
+
+    history: Optional[Dict[str, List[Tuple[str, str, str, str]]]] = None
+    repo_file_paths: Dict[str, str] = {}
+    if args.cache:
+        repo_file_paths = get_repo_file_paths([str(file_path) for file_path in files])
+        history = get_cached_file_commits(list(repo_file_paths.values()), args.cache, args.patch_classifier)
+    else:
+        if args.patch_classifier:
+            classify_timeline_patches()
+        if args.single_pass or args.in_process:
+            repo_file_paths = get_repo_file_paths([str(file_path) for file_path in files])
+            history = get_all_file_commits(list(repo_file_paths.values()))
+
+    def task(file_path: Path) -> Callable[[], bool]:
+        return lambda: update_file_timeline(
+            file_path,
+            repo_url,
+            history,
+            repo_file_paths,
+            filter_commits=not args.cache,
         )
 
-        modified = inject_timeline(file_path, markdown)
-        if modified:
-            updated += 1
-            debug(f"Timeline injected into {file_path}")
+    updated = 0
+    if args.jobs == 1:
+        for file_path in files:
+            if task(file_path)():
+                updated += 1
+                if corpus is not None:
+                    corpus.written(file_path)
+    else:
+        set_git_concurrency(args.max_git_procs or args.jobs)
+        log(f"Processing {len(files)} files with {args.jobs} jobs")
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            # map() yields in submission order, so output stays in file order.
+            results = pool.map(run_buffered, [task(file_path) for file_path in files])
+            for file_path, (modified, lines, exc) in zip(files, results):
+                for line in lines:
+                    print(line, flush=True)
+                if exc is not None:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise exc
+                if modified:
+                    updated += 1
+                    if corpus is not None:
+                        corpus.written(file_path)
 
     log(f"Timelines updated in {updated} files")
 
+    broker = get_object_broker()
+    broker.close()
+    if _repository is not None:
+        log(f"Read git objects in-process ({len(normalized_blobs)} unique blobs normalized)")
+    elif broker.spawns_saved:
+        log(
+            f"Timeline-only detection used 1 git cat-file process instead of "
+            f"{broker.spawns_saved} (saved {broker.spawns_saved - 1} spawns, "
+            f"{len(normalized_blobs)} unique blobs normalized)"
+        )
+
 
 if __name__ == "__main__":
     main()
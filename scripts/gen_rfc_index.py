@@ -3,126 +3,578 @@
 Generate a JSON index of RFC metadata for the landing page filters.
 
 Scans the docs/ tree for Markdown files and writes
-`docs/rfc-index.json`.
+`docs/rfc-index.json`, or with --sharded a compact manifest in its place
+and one shard per component under `docs/rfc-index/`. A search index over
+titles, headings and metadata is written alongside.
 """
 from __future__ import annotations
 
+import argparse
+import hashlib
+import heapq
+import itertools
 import json
+import os
+import shutil
 from pathlib import Path
 from datetime import date
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 import html
 import re
 import subprocess
 
+import git_objects
+import instrument
+import spec_header
+from build_cache import write_if_changed
+
+if TYPE_CHECKING:
+    from corpus import Corpus
+
 ROOT = Path(__file__).resolve().parent.parent
 DOCS = ROOT / "docs"
 OUTPUT = DOCS / "rfc-index.json"
+SEARCH_OUTPUT = DOCS / "rfc-search.json"
+SHARD_DIR = DOCS / "rfc-index"
+# Column order of the rows in each shard; the component is implied by the shard.
+SHARD_FIELDS = ["slug", "title", "status", "category", "updated", "path"]
+SHARD_SEARCH = "search.json"
+
+HEADING_RE = re.compile(r"^ {0,3}(#{2,3})\s+(.+?)(?:\s+#+)?\s*$")
+# Written by gen_history.py, which may run at the same time as this script.
+TIMELINE_BLOCK = re.compile(r"<!-- timeline:start -->.*?<!-- timeline:end -->", re.DOTALL)
+# Link targets, autolinks and bare URLs carry no useful search terms.
+LINK_TARGET_RE = re.compile(r"\]\([^)]*\)|<[^>]*>|https?://\S+")
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+DEFAULT_PARSE_CACHE = ROOT / ".cache" / "gen_rfc_index.json"
+PARSE_CACHE_VERSION = 3
 
 EXCLUDE_FILES = {"README.md", "SUMMARY.md", "about.md"}
 EXCLUDE_PARTS = {"previous-versions"}
 
+# In-process object reader used instead of `git log` when enabled.
+_repository: Optional[git_objects.Repository] = None
+
+
+def header_meta(header: spec_header.SpecHeader) -> Dict[str, str]:
+    return {key: html.unescape(value) for key, value in header.meta().items() if value}
+
 
 def parse_meta_from_markdown_table(text: str) -> Optional[Dict[str, str]]:
-    lines = text.splitlines()
-    meta: Dict[str, str] = {}
-    for i in range(len(lines) - 2):
-        line = lines[i].strip()
-        next_line = lines[i + 1].strip()
-        if not (line.startswith('|') and next_line.startswith('|') and '---' in next_line):
+    return header_meta(spec_header.parse_header(text.splitlines())) or None
+
+
+def parse_headings(text: str) -> List[str]:
+    """
+    Return the text of the H2 and H3 headings outside fenced code blocks
+    and the generated timeline block.
+    """
+    headings: List[str] = []
+    fence: Optional[str] = None
+    for line in TIMELINE_BLOCK.sub("", text).splitlines():
+        stripped = line.strip()
+        if stripped.startswith(("```", "~~~")):
+            if fence is None:
+                fence = stripped[:3]
+            elif stripped.startswith(fence):
+                fence = None
+            continue
+        if fence is not None:
             continue
+        match = HEADING_RE.match(line)
+        if match:
+            headings.append(match.group(2))
+    return headings
 
-        # Simple two-column table parsing
-        j = i + 2
-        while j < len(lines) and lines[j].strip().startswith('|'):
-            parts = [p.strip() for p in lines[j].strip().strip('|').split('|')]
-            if len(parts) >= 2:
-                key = parts[0].lower()
-                value = html.unescape(parts[1])
-                if key and value:
-                    meta[key] = value
-            j += 1
-        break
 
-    return meta or None
+class SearchIndex:
+    """
+    Inverted index from lowercase words to the specs whose title, H2/H3
+    headings or metadata contain them.
 
+    It is serialized as parallel arrays: `terms` (sorted), `postings` (the
+    sorted document numbers of each term) and `docs` (page paths), so the
+    landing page answers a prefix query with one binary search and a short
+    scan.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SearchIndex":
+        index = cls()
+        docs = data["docs"]
+        for term, numbers in zip(data["terms"], data["postings"]):
+            index.postings[term] = {docs[number] for number in numbers}
+        return index
+
+    def add(self, path: str, texts: List[str]) -> None:
+        for text in texts:
+            for token in TOKEN_RE.findall(LINK_TARGET_RE.sub("]", text).lower()):
+                self.postings.setdefault(token, set()).add(path)
+
+    def remove(self, paths: Set[str]) -> None:
+        for term in list(self.postings):
+            self.postings[term] -= paths
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def to_json(self) -> Dict[str, object]:
+        docs = sorted(set().union(*self.postings.values()))
+        numbers = {path: number for number, path in enumerate(docs)}
+        terms = sorted(self.postings)
+        return {
+            "version": 1,
+            "docs": docs,
+            "terms": terms,
+            "postings": [sorted(numbers[path] for path in self.postings[term]) for term in terms],
+        }
 
-def parse_title_from_h1(text: str) -> Optional[str]:
-    match = re.search(r"^#\\s+(.+)$", text, flags=re.MULTILINE)
-    if not match:
-        return None
-    return match.group(1).strip()
 
 def run_git(args: List[str]) -> str:
-    result = subprocess.run(
-        ["git"] + args,
-        cwd=ROOT,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        encoding="utf-8",
-    )
+    with instrument.git_call(args):
+        result = subprocess.run(
+            ["git"] + args,
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+        )
     if result.returncode != 0:
         return ""
     return result.stdout.strip()
 
 
-def get_last_updated(path: Path) -> str:
+def last_commit_date_in_process(repo: git_objects.Repository, rel: str) -> Optional[str]:
+    """
+    The date `git log -1 --date=short -- <rel>` prints: walk newest first,
+    following only a parent the file is unchanged in (git's default history
+    simplification), until a commit that changed it.
+    """
+    counter = itertools.count()
+    queue: List[Tuple[int, int, str]] = []
+    seen: Set[str] = set()
+
+    def push(sha: str) -> None:
+        if sha not in seen:
+            seen.add(sha)
+            heapq.heappush(queue, (-repo.commit(sha).committer_time, next(counter), sha))
+
+    push(repo.head())
+    while queue:
+        _, _, sha = heapq.heappop(queue)
+        commit = repo.commit(sha)
+        entry = repo.entry_at(commit.tree, rel)
+        if not commit.parents:
+            if entry is not None:
+                return commit.author_date
+            continue
+        same = [parent for parent in commit.parents if repo.entry_at(repo.commit(parent).tree, rel) == entry]
+        if not same:
+            return commit.author_date
+        push(same[0])
+    return None
+
+
+def get_last_updated_map(paths: List[Path]) -> Dict[str, str]:
+    """
+    Map the ROOT-relative form of each of `paths` to the date of the last
+    commit that changed it, as `git log -1 -- <path>` gives it, from one
+    streamed `git log --name-only` walk over docs/. The walk stops as soon
+    as every tracked path has been seen; untracked paths are left out.
+
+    The walk uses full history, listing each merge's changes against every
+    parent (-m). Where a merge kept one parent's version of a path, the
+    per-path history simplification of `git log -- <path>` would follow
+    that parent only, so such paths are looked up again on their own. A
+    merge that differs from every parent is the path's last change, and
+    so is the first non-merge commit changing it when no merge came first.
+    """
+    docs = DOCS.relative_to(ROOT).as_posix()
+    tracked = set(run_git(["ls-files", "-z", "--", docs]).split("\0"))
+    # The walk never lists an untracked path, so waiting for one would read
+    # all of history.
+    pending = {path.relative_to(ROOT).as_posix() for path in paths} & tracked
+    dates: Dict[str, str] = {}
+    recheck: Set[str] = set()
+    args = [
+        "log", "-z", "--format=%x01%H %ad %P", "--date=short", "--name-only",
+        "-m", "--full-history", "--relative", "--", docs,
+    ]
+    # The merge being read: its hash, date, number of parents, and how many
+    # of its per-parent diffs list each path first seen in it.
+    merge: Optional[Tuple[str, str, int]] = None
+    listed: Dict[str, int] = {}
+
+    def finish_merge() -> None:
+        if merge is not None:
+            for name, count in listed.items():
+                if count == merge[2]:
+                    dates[name] = merge[1]
+                else:
+                    recheck.add(name)
+        listed.clear()
+
+    with instrument.git_call(args):
+        proc = subprocess.Popen(
+            ["git"] + args,
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        assert proc.stdout is not None
+        current: Optional[str] = None
+        rest = b""
+        try:
+            # A merge's diffs come one after another, so keep reading until
+            # the one that emptied `pending` is complete.
+            while pending or listed:
+                chunk = proc.stdout.read(1 << 16)
+                if not chunk:
+                    break
+                *tokens, rest = (rest + chunk).split(b"\0")
+                for token in tokens:
+                    token = token.lstrip(b"\n")
+                    if token.startswith(b"\x01"):
+                        sha, day, *parents = token[1:].decode("utf-8").split(" ")
+                        parents = [parent for parent in parents if parent]
+                        if merge is None or merge[0] != sha:
+                            finish_merge()
+                            merge = (sha, day, len(parents)) if len(parents) > 1 else None
+                        current = day
+                        if not pending and not listed:
+                            break
+                    elif current is not None:
+                        name = token.decode("utf-8", errors="replace")
+                        if merge is not None:
+                            if name in pending or name in listed:
+                                pending.discard(name)
+                                listed[name] = listed.get(name, 0) + 1
+                        elif name in pending:
+                            pending.discard(name)
+                            dates[name] = current
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+    finish_merge()
+
+    for rel in sorted(recheck):
+        updated = run_git(["log", "-1", "--format=%ad", "--date=short", "--", rel])
+        if updated:
+            dates[rel] = updated
+    return dates
+
+
+def get_last_updated(path: Path, last_updated: Optional[Dict[str, str]] = None) -> str:
+    global _repository
     rel = path.relative_to(ROOT).as_posix()
+    if _repository is not None:
+        try:
+            updated = last_commit_date_in_process(_repository, rel)
+        except git_objects.UnsupportedRepository as exc:
+            print(f"[INFO] In-process git reader failed ({exc}); falling back to the git CLI")
+            _repository = None
+        else:
+            return updated or date.today().isoformat()
+
+    if last_updated is not None:
+        return last_updated.get(rel) or date.today().isoformat()
+
     output = run_git(["log", "-1", "--format=%ad", "--date=short", "--", rel])
     if output:
         return output
     return date.today().isoformat()
 
 
-def collect() -> List[Dict[str, str]]:
-    entries: List[Dict[str, str]] = []
-    for path in DOCS.rglob("*.md"):
-        rel = path.relative_to(DOCS)
+def parse_doc(text: str) -> Dict[str, Any]:
+    """Everything collect() needs from a spec's text."""
+    header = spec_header.parse_header(text.splitlines())
+    return {
+        "meta": header_meta(header),
+        "h1": header.title,
+        "headings": parse_headings(text),
+    }
 
-        if rel.name in EXCLUDE_FILES:
-            continue
-        if EXCLUDE_PARTS.intersection(rel.parts):
-            continue
 
-        text = path.read_text(encoding="utf-8", errors="ignore")
+def load_parse_cache(cache_path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != PARSE_CACHE_VERSION:
+        return {}
+    return data.get("files", {})
 
-        meta = parse_meta_from_markdown_table(text) or {}
 
-        slug = meta.get("slug")
-        title = meta.get("title") or meta.get("name") or parse_title_from_h1(text) or rel.stem
-        status = meta.get("status") or "unknown"
-        category = meta.get("category") or "unspecified"
-        component = rel.parts[0]
+def save_parse_cache(cache_path: Path, files: Dict[str, Dict[str, Any]]) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"version": PARSE_CACHE_VERSION, "files": dict(sorted(files.items()))}
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, cache_path)
 
-        # Skip the template placeholder
-        if slug == "XX":
-            continue
 
-        # mdBook renders Markdown to .html, keep links consistent
-        html_path = rel.with_suffix(".html").as_posix()
-
-        updated = get_last_updated(path)
-
-        entries.append(
-            {
-                "component": component,
-                "slug": str(slug) if slug is not None else title,
-                "title": title,
-                "status": status,
-                "category": category,
-                "updated": updated,
-                "path": html_path,
-            }
-        )
+def is_indexed(rel: Path) -> bool:
+    return rel.name not in EXCLUDE_FILES and not EXCLUDE_PARTS.intersection(rel.parts)
+
+
+def parse_cached(rel: str, data: bytes, parsed: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """The parse_doc() result for `data`, from `parsed` unless the hash changed."""
+    digest = hashlib.sha256(data).hexdigest()
+    cached = parsed.get(rel)
+    if cached is None or cached.get("hash") != digest:
+        # Same decoding as Path.read_text(errors="ignore").
+        text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+        cached = {"hash": digest, **parse_doc(text)}
+    return cached
+
+
+def make_entry(
+    path: Path,
+    cached: Dict[str, Any],
+    updated: str,
+    search: Optional[SearchIndex] = None,
+) -> Optional[Dict[str, str]]:
+    """The index entry of one spec, or None for the template placeholder."""
+    rel = path.relative_to(DOCS)
+    meta = cached["meta"]
+
+    slug = meta.get("slug")
+    title = meta.get("title") or meta.get("name") or cached["h1"] or rel.stem
+    status = meta.get("status") or "unknown"
+    category = meta.get("category") or "unspecified"
+    component = rel.parts[0]
+
+    # Skip the template placeholder
+    if slug == "XX":
+        return None
+
+    # mdBook renders Markdown to .html, keep links consistent
+    html_path = rel.with_suffix(".html").as_posix()
+
+    if search is not None:
+        search.add(html_path, [title, *meta.values(), *cached["headings"]])
+
+    return {
+        "component": component,
+        "slug": str(slug) if slug is not None else title,
+        "title": title,
+        "status": status,
+        "category": category,
+        "updated": updated,
+        "path": html_path,
+    }
+
+
+def collect(
+    search: Optional[SearchIndex] = None,
+    parsed: Optional[Dict[str, Dict[str, Any]]] = None,
+    corpus: Optional[Corpus] = None,
+) -> List[Dict[str, str]]:
+    """
+    Build the index entries. `parsed` maps each spec (relative to DOCS) to
+    its content hash and parse_doc() result from a previous run; only
+    specs whose hash changed are parsed again, and the mapping is updated
+    in place to describe the current tree. With a `corpus` its file list and
+    contents are used instead of reading docs/ again.
+    """
+    if parsed is None:
+        parsed = {}
+    entries: List[Dict[str, str]] = []
+    paths = []
+    for path in (doc.path for doc in corpus) if corpus is not None else DOCS.rglob("*.md"):
+        if is_indexed(path.relative_to(DOCS)):
+            paths.append(path)
+
+    last_updated = get_last_updated_map(paths) if _repository is None else None
+
+    current: Dict[str, Dict[str, Any]] = {}
+    for path in paths:
+        rel = path.relative_to(DOCS).as_posix()
+        doc = corpus.get(path) if corpus is not None else None
+        data = doc.data() if doc is not None else path.read_bytes()
+        current[rel] = parse_cached(rel, data, parsed)
+        entry = make_entry(path, current[rel], get_last_updated(path, last_updated), search)
+        if entry is not None:
+            entries.append(entry)
+
+    parsed.clear()
+    parsed.update(current)
 
     entries.sort(key=lambda r: (r["component"], r["slug"]))
     return entries
 
 
-def main() -> None:
-    entries = collect()
-    OUTPUT.write_text(json.dumps(entries, indent=2), encoding="utf-8")
-    print(f"Wrote {len(entries)} entries to {OUTPUT}")
+def load_index() -> Optional[Tuple[List[Dict[str, str]], SearchIndex]]:
+    """
+    The entries and search index an earlier run wrote, in either layout,
+    or None when they are missing or unreadable.
+    """
+    try:
+        data = json.loads(OUTPUT.read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            entries = data
+            search = json.loads(SEARCH_OUTPUT.read_text(encoding="utf-8"))
+        else:
+            entries = []
+            for component, shard in data["components"].items():
+                rows = json.loads((SHARD_DIR / shard["shard"]).read_text(encoding="utf-8"))
+                entries += [{"component": component, **dict(zip(data["fields"], row))} for row in rows]
+            search = json.loads((SHARD_DIR / data["search"]).read_text(encoding="utf-8"))
+        return entries, SearchIndex.from_json(search)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def update_entries(
+    entries: List[Dict[str, str]],
+    search: SearchIndex,
+    paths: List[Path],
+    parsed: Dict[str, Dict[str, Any]],
+) -> List[Dict[str, str]]:
+    """
+    Replace the entries and search terms of `paths` (specs under DOCS that
+    were added, edited or removed) in the output of an earlier run. Only
+    these specs are read, and their last-updated dates looked up.
+    """
+    html_paths = {path.relative_to(DOCS).with_suffix(".html").as_posix() for path in paths}
+    patched = [entry for entry in entries if entry["path"] not in html_paths]
+    search.remove(html_paths)
+    for path in paths:
+        rel = path.relative_to(DOCS).as_posix()
+        if not is_indexed(path.relative_to(DOCS)) or not path.is_file():
+            parsed.pop(rel, None)
+            continue
+        parsed[rel] = parse_cached(rel, path.read_bytes(), parsed)
+        entry = make_entry(path, parsed[rel], get_last_updated(path), search)
+        if entry is not None:
+            patched.append(entry)
+
+    patched.sort(key=lambda r: (r["component"], r["slug"]))
+    return patched
+
+
+def compact_json(value: object) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_sharded(entries: List[Dict[str, str]], search: SearchIndex) -> int:
+    """
+    Write one compact shard per component, and in place of the single-file
+    index a manifest listing them, so the landing page only downloads the
+    components a page or its component filter shows. The page tells the
+    layouts apart by the first file it loads (a list of entries or a
+    manifest object), without probing for files that may not exist. Returns
+    the number of files written; unchanged files are left untouched.
+    """
+    shards: Dict[str, List[List[str]]] = {}
+    for entry in entries:
+        shards.setdefault(entry["component"], []).append([entry[field] for field in SHARD_FIELDS])
+
+    files: Dict[str, bytes] = {}
+    components = {}
+    for component, rows in shards.items():
+        name = f"{component}.json"
+        files[name] = compact_json(rows)
+        components[component] = {"shard": name, "count": len(rows)}
+    files[SHARD_SEARCH] = compact_json(search.to_json())
+    manifest = {"version": 1, "fields": SHARD_FIELDS, "components": components, "search": SHARD_SEARCH}
+
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    for path in SHARD_DIR.iterdir():
+        if path.name not in files:
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+    SEARCH_OUTPUT.unlink(missing_ok=True)
+    written = sum(write_if_changed(SHARD_DIR / name, data) for name, data in files.items())
+    return written + write_if_changed(OUTPUT, compact_json(manifest))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate docs/rfc-index.json.")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        metavar="FILE",
+        help=(
+            "Only re-read these specs (added, edited or removed) and update their entries "
+            "in the existing index (default: index every spec under docs/)."
+        ),
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Read last-updated dates in-process instead of running git log per file.",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_PARSE_CACHE,
+        help=(
+            "Keep content hashes and parsed metadata of every spec at this path "
+            f"(default: {DEFAULT_PARSE_CACHE.relative_to(ROOT)}) and only re-parse changed specs."
+        ),
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help=(
+            f"Write a compact manifest to {OUTPUT.relative_to(ROOT)} and one "
+            f"shard per component to {SHARD_DIR.relative_to(ROOT)}/."
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None, corpus: Optional[Corpus] = None) -> None:
+    global _repository
+    args = parse_args(argv)
+    if args.in_process:
+        try:
+            _repository = git_objects.open_repository(ROOT)
+        except git_objects.UnsupportedRepository as exc:
+            print(f"[INFO] In-process git reader unavailable ({exc}); using the git CLI")
+
+    parsed = load_parse_cache(args.cache) if args.cache else {}
+    hashes = {rel: doc.get("hash") for rel, doc in parsed.items()}
+    previous = load_index() if args.files else None
+    if previous is not None:
+        entries, search = previous
+        paths = sorted({path.resolve() for path in args.files if DOCS in path.resolve().parents})
+        entries = update_entries(entries, search, paths, parsed)
+    else:
+        if args.files:
+            print(f"[INFO] No readable index at {OUTPUT}; indexing every spec")
+        search = SearchIndex()
+        entries = collect(search, parsed, corpus)
+    if args.cache:
+        save_parse_cache(args.cache, parsed)
+        changed = sum(1 for rel, doc in parsed.items() if hashes.get(rel) != doc["hash"])
+        print(f"Parsed {changed} new or changed specs ({len(parsed) - changed} unchanged)")
+
+    if args.sharded:
+        written = write_sharded(entries, search)
+        destination = SHARD_DIR
+    else:
+        if SHARD_DIR.exists():
+            # Nothing references the shards of an earlier --sharded run.
+            shutil.rmtree(SHARD_DIR)
+        written = write_if_changed(OUTPUT, json.dumps(entries, indent=2).encode("utf-8"))
+        written += write_if_changed(SEARCH_OUTPUT, compact_json(search.to_json()))
+        destination = OUTPUT
+
+    if written:
+        print(f"Wrote {len(entries)} entries to {destination}")
+    else:
+        print(f"{destination} is up to date ({len(entries)} entries)")
 
 
 if __name__ == "__main__":
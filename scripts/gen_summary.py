@@ -3,13 +3,22 @@
 Generate docs/SUMMARY.md from the docs/ tree.
 
 This keeps a consistent navigation structure for mdBook without manual edits.
+
+Given files (added, edited or removed specs), only those are read; the
+labels of the others are taken from the existing SUMMARY.md.
 """
 from __future__ import annotations
 
+import argparse
 from dataclasses import dataclass
 from pathlib import Path
 import re
-from typing import Iterable, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from build_cache import write_if_changed
+
+if TYPE_CHECKING:
+    from corpus import Corpus
 
 ROOT = Path(__file__).resolve().parent.parent
 DOCS = ROOT / "docs"
@@ -19,6 +28,13 @@ SKIP_FILES = {"README.md", "SUMMARY.md"}
 
 TOP_LEVEL = ["messaging", "blockchain", "storage", "ift-ts"]
 
+# Shared docs/ model when run from build.py; files are read directly otherwise.
+_corpus: Optional[Corpus] = None
+# Labels of the files that did not change, from the existing SUMMARY.md.
+_labels: Dict[Path, str] = {}
+
+ENTRY_RE = re.compile(r"^\s*- \[(.*)\]\(([^()]*)\)$")
+
 LABEL_OVERRIDES = {
     "ift-ts": "IFT-TS",
     "messaging/standards/core": "Standards - Core",
@@ -78,7 +94,9 @@ class Item:
 
 
 def read_h1(path: Path) -> Optional[str]:
-    for line in path.read_text(encoding="utf-8", errors="ignore").splitlines():
+    doc = _corpus.get(path) if _corpus is not None else None
+    text = doc.text() if doc is not None else path.read_text(encoding="utf-8", errors="ignore")
+    for line in text.splitlines():
         if line.startswith("# "):
             return line[2:].strip()
     return None
@@ -102,7 +120,25 @@ def humanize(stem: str) -> str:
     return " ".join(words)
 
 
+def read_labels(skip: Iterable[Path]) -> Dict[Path, str]:
+    """The label of every entry in the existing SUMMARY.md, except for `skip`."""
+    try:
+        text = OUTPUT.read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    labels = {}
+    for line in text.splitlines():
+        match = ENTRY_RE.match(line)
+        if match:
+            labels[DOCS / match.group(2)] = match.group(1)
+    for path in skip:
+        labels.pop(path, None)
+    return labels
+
+
 def label_for_file(path: Path) -> str:
+    if path in _labels:
+        return _labels[path]
     title = read_h1(path)
     if not title:
         title = humanize(path.stem)
@@ -203,7 +239,26 @@ def render_items(items: Iterable[Item], depth: int, lines: List[str]) -> None:
             render_items(item.children, depth + 1, lines)
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate docs/SUMMARY.md.")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        metavar="FILE",
+        help=(
+            "Only read these files (added, edited or removed) and reuse the other labels "
+            "from the existing SUMMARY.md (default: read every file)."
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None, corpus: Optional[Corpus] = None) -> None:
+    global _corpus, _labels
+    args = parse_args(argv)
+    _corpus = corpus
+    _labels = read_labels(path.resolve() for path in args.files) if args.files else {}
     lines: List[str] = ["# Summary", ""]
 
     if (DOCS / "README.md").exists():
@@ -223,7 +278,11 @@ def main() -> None:
         render_items(children, 1, lines)
         lines.append("")
 
-    OUTPUT.write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
+    if not write_if_changed(OUTPUT, ("\n".join(lines).rstrip() + "\n").encode("utf-8")):
+        print(f"{OUTPUT} is up to date")
+        return
+    if corpus is not None:
+        corpus.written(OUTPUT)
     print(f"Wrote {OUTPUT}")
 
 
@@ -0,0 +1,705 @@
+#!/usr/bin/env python3
+"""
+Read-only access to a git repository's objects without spawning git.
+
+Pack indexes and packfiles are memory-mapped, loose objects are inflated
+directly, and commits and trees are parsed into small Python objects. This
+is enough for the history generators to walk commits and look up blobs by
+path in-process.
+
+Anything this module does not understand (SHA-256 repositories, unknown
+pack or index versions, reftable refs, corrupt objects) raises
+`UnsupportedRepository`, so callers can fall back to the git CLI.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import mmap
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {OBJ_COMMIT: "commit", OBJ_TREE: "tree", OBJ_BLOB: "blob", OBJ_TAG: "tag"}
+
+TREE_MODE = b"40000"
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# Commits popped after only uninteresting ones remain before a range walk stops,
+# mirroring git's SLOP for clock skew.
+WALK_SLOP = 5
+# Resolved objects kept in memory per pack, by offset, to speed up delta chains.
+DELTA_CACHE_SIZE = 256
+
+
+class UnsupportedRepository(Exception):
+    """Raised for anything the reader cannot decode; use the git CLI instead."""
+
+
+@dataclass
+class Commit:
+    sha: str
+    tree: str
+    parents: List[str]
+    author_time: int
+    author_tz: str
+    committer_time: int
+    message: str
+
+    @property
+    def subject(self) -> str:
+        """The commit subject as `git log --format=%s` prints it."""
+        lines = self.message.split("\n")
+        idx = 0
+        while idx < len(lines) and not lines[idx].strip():
+            idx += 1
+        subject: List[str] = []
+        while idx < len(lines) and lines[idx].strip():
+            subject.append(lines[idx].rstrip())
+            idx += 1
+        return " ".join(subject)
+
+    @property
+    def author_date(self) -> str:
+        """The author date as `git log --date=short` prints it."""
+        return format_short_date(self.author_time, self.author_tz)
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    mode: bytes
+    sha: str
+
+    @property
+    def is_tree(self) -> bool:
+        return self.mode == TREE_MODE
+
+
+def format_short_date(timestamp: int, tz: str) -> str:
+    sign = -1 if tz.startswith("-") else 1
+    digits = tz.lstrip("+-")
+    if len(digits) != 4 or not digits.isdigit():
+        raise UnsupportedRepository(f"unsupported timezone {tz!r}")
+    offset = sign * (int(digits[:2]) * 60 + int(digits[2:]))
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc) + timedelta(minutes=offset)
+    return moment.strftime("%Y-%m-%d")
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    pos = 0
+
+    def varint() -> int:
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = delta[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value
+
+    if varint() != len(base):
+        raise UnsupportedRepository("delta base size mismatch")
+    target_size = varint()
+
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = size = 0
+            for bit in range(4):
+                if op & (1 << bit):
+                    offset |= delta[pos] << (8 * bit)
+                    pos += 1
+            for bit in range(3):
+                if op & (1 << (4 + bit)):
+                    size |= delta[pos] << (8 * bit)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out += base[offset:offset + size]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise UnsupportedRepository("invalid delta opcode 0")
+
+    if len(out) != target_size:
+        raise UnsupportedRepository("delta result size mismatch")
+    return bytes(out)
+
+
+def inflate(data: mmap.mmap, offset: int, size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    out = b""
+    chunk = max(size + 64, 512)
+    pos = offset
+    while not decompressor.eof:
+        block = data[pos:pos + chunk]
+        if not block:
+            raise UnsupportedRepository("truncated compressed object")
+        out += decompressor.decompress(block)
+        pos += len(block)
+        chunk *= 2
+    if len(out) != size:
+        raise UnsupportedRepository("inflated object size mismatch")
+    return out
+
+
+class PackIndex:
+    """A memory-mapped `.idx` file (version 1 or 2)."""
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as handle:
+            self.data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] == b"\xfftOc":
+            self.version = struct.unpack(">I", self.data[4:8])[0]
+            if self.version != 2:
+                raise UnsupportedRepository(f"unsupported pack index version {self.version} in {path}")
+            self.fanout_at = 8
+        else:
+            self.version = 1
+            self.fanout_at = 0
+        self.count = struct.unpack(">I", self.data[self.fanout_at + 255 * 4:self.fanout_at + 256 * 4])[0]
+        base = self.fanout_at + 256 * 4
+        if self.version == 2:
+            self.names_at = base
+            self.offsets_at = base + self.count * 24
+            self.large_offsets_at = self.offsets_at + self.count * 4
+
+    def _fanout(self, byte: int) -> int:
+        if byte < 0:
+            return 0
+        at = self.fanout_at + byte * 4
+        return struct.unpack(">I", self.data[at:at + 4])[0]
+
+    def _name(self, idx: int) -> bytes:
+        if self.version == 2:
+            at = self.names_at + idx * 20
+        else:
+            at = self.fanout_at + 256 * 4 + idx * 24 + 4
+        return self.data[at:at + 20]
+
+    def _offset(self, idx: int) -> int:
+        if self.version == 1:
+            at = self.fanout_at + 256 * 4 + idx * 24
+            return struct.unpack(">I", self.data[at:at + 4])[0]
+        at = self.offsets_at + idx * 4
+        offset = struct.unpack(">I", self.data[at:at + 4])[0]
+        if offset & 0x80000000:
+            at = self.large_offsets_at + (offset & 0x7FFFFFFF) * 8
+            offset = struct.unpack(">Q", self.data[at:at + 8])[0]
+        return offset
+
+    def find(self, binsha: bytes) -> Optional[int]:
+        lo = self._fanout(binsha[0] - 1)
+        hi = self._fanout(binsha[0])
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self._name(mid)
+            if name < binsha:
+                lo = mid + 1
+            elif name > binsha:
+                hi = mid
+            else:
+                return self._offset(mid)
+        return None
+
+
+class Pack:
+    """A memory-mapped `.pack` file (version 2 or 3) and its index."""
+
+    def __init__(self, path: Path, repo: "Repository") -> None:
+        self.index = PackIndex(path.with_suffix(".idx"))
+        with path.open("rb") as handle:
+            self.data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != b"PACK":
+            raise UnsupportedRepository(f"{path} is not a packfile")
+        version = struct.unpack(">I", self.data[4:8])[0]
+        if version not in (2, 3):
+            raise UnsupportedRepository(f"unsupported pack version {version} in {path}")
+        self.repo = repo
+        self.cache: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+
+    def _header(self, offset: int) -> Tuple[int, int, int]:
+        byte = self.data[offset]
+        offset += 1
+        obj_type = (byte >> 4) & 0x07
+        size = byte & 0x0F
+        shift = 4
+        while byte & 0x80:
+            byte = self.data[offset]
+            offset += 1
+            size |= (byte & 0x7F) << shift
+            shift += 7
+        return obj_type, size, offset
+
+    def read_at(self, offset: int) -> Tuple[int, bytes]:
+        # Walk the delta chain down to a full object, then apply deltas back up.
+        chain: List[Tuple[int, bytes]] = []
+        while True:
+            cached = self.cache.get(offset)
+            if cached is not None:
+                self.cache.move_to_end(offset)
+                obj_type, data = cached
+                break
+
+            obj_type, size, pos = self._header(offset)
+            if obj_type == OBJ_OFS_DELTA:
+                byte = self.data[pos]
+                pos += 1
+                distance = byte & 0x7F
+                while byte & 0x80:
+                    byte = self.data[pos]
+                    pos += 1
+                    distance = ((distance + 1) << 7) | (byte & 0x7F)
+                chain.append((offset, inflate(self.data, pos, size)))
+                offset -= distance
+                continue
+            if obj_type == OBJ_REF_DELTA:
+                base_sha = self.data[pos:pos + 20].hex()
+                chain.append((offset, inflate(self.data, pos + 20, size)))
+                obj_type, data = self.repo.read_object(base_sha)
+                break
+            if obj_type not in TYPE_NAMES:
+                raise UnsupportedRepository(f"unsupported pack object type {obj_type}")
+            data = inflate(self.data, pos, size)
+            self._remember(offset, obj_type, data)
+            break
+
+        for delta_offset, delta in reversed(chain):
+            data = apply_delta(data, delta)
+            self._remember(delta_offset, obj_type, data)
+        return obj_type, data
+
+    def _remember(self, offset: int, obj_type: int, data: bytes) -> None:
+        self.cache[offset] = (obj_type, data)
+        if len(self.cache) > DELTA_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+
+class Repository:
+    """Read-only view of the objects and refs of the repository at `root`."""
+
+    def __init__(self, root: Path) -> None:
+        git_dir = root / ".git"
+        if git_dir.is_file():
+            content = git_dir.read_text(encoding="utf-8").strip()
+            if not content.startswith("gitdir:"):
+                raise UnsupportedRepository(f"unrecognized .git file in {root}")
+            git_dir = (root / content[len("gitdir:"):].strip()).resolve()
+        if not git_dir.is_dir():
+            raise UnsupportedRepository(f"no git directory found in {root}")
+
+        self.root = root
+        self.git_dir = git_dir
+        common = git_dir / "commondir"
+        self.common_dir = (git_dir / common.read_text(encoding="utf-8").strip()).resolve() if common.exists() else git_dir
+
+        self.config = self._read_config(self.common_dir / "config")
+        if self.config.get(("extensions", "", "objectformat"), "sha1").lower() != "sha1":
+            raise UnsupportedRepository("only SHA-1 repositories are supported")
+        if (self.common_dir / "reftable").exists():
+            raise UnsupportedRepository("reftable refs are not supported")
+
+        self.object_dirs = self._object_dirs(self.common_dir / "objects")
+        self.packs: List[Pack] = []
+        for object_dir in self.object_dirs:
+            pack_dir = object_dir / "pack"
+            if pack_dir.is_dir():
+                for pack_path in sorted(pack_dir.glob("*.pack")):
+                    if pack_path.with_suffix(".idx").exists():
+                        self.packs.append(Pack(pack_path, self))
+
+        self.shallow: Set[str] = set()
+        shallow = self.common_dir / "shallow"
+        if shallow.exists():
+            self.shallow = set(shallow.read_text(encoding="utf-8").split())
+
+        self.commits: Dict[str, Commit] = {}
+        self.trees: Dict[str, Dict[str, TreeEntry]] = {}
+        self.blob_lists: Dict[str, List[Tuple[str, TreeEntry]]] = {}
+        # Pack delta caches are shared, so object reads are serialized.
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _object_dirs(objects: Path) -> List[Path]:
+        dirs = [objects]
+        alternates = objects / "info" / "alternates"
+        if alternates.exists():
+            for line in alternates.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    dirs.append((objects / line).resolve())
+        return dirs
+
+    @staticmethod
+    def _read_config(path: Path) -> Dict[Tuple[str, str, str], str]:
+        """Parse the plain `[section "subsection"] key = value` subset of git config."""
+        values: Dict[Tuple[str, str, str], str] = {}
+        if not path.exists():
+            return values
+        section = subsection = ""
+        for raw in path.read_text(encoding="utf-8", errors="replace").splitlines():
+            line = raw.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("["):
+                header = line[1:line.index("]")] if "]" in line else line[1:]
+                name, _, sub = header.partition(" ")
+                section = name.strip().lower()
+                subsection = sub.strip().strip('"')
+                continue
+            key, _, value = line.partition("=")
+            values[(section, subsection, key.strip().lower())] = value.strip().strip('"')
+        return values
+
+    def config_value(self, section: str, subsection: str, key: str) -> Optional[str]:
+        return self.config.get((section.lower(), subsection, key.lower()))
+
+    # Refs
+
+    def resolve_ref(self, name: str) -> str:
+        for _ in range(10):
+            path = (self.git_dir if name == "HEAD" else self.common_dir) / name
+            if path.is_file():
+                value = path.read_text(encoding="utf-8").strip()
+            else:
+                value = self._packed_ref(name)
+                if value is None:
+                    raise UnsupportedRepository(f"cannot resolve ref {name}")
+            if value.startswith("ref:"):
+                name = value[len("ref:"):].strip()
+                continue
+            return value
+        raise UnsupportedRepository(f"ref {name} is nested too deeply")
+
+    def _packed_ref(self, name: str) -> Optional[str]:
+        packed = self.common_dir / "packed-refs"
+        if not packed.exists():
+            return None
+        for line in packed.read_text(encoding="utf-8").splitlines():
+            if line.startswith(("#", "^")):
+                continue
+            sha, _, ref = line.partition(" ")
+            if ref.strip() == name:
+                return sha
+        return None
+
+    def head(self) -> str:
+        return self.resolve_ref("HEAD")
+
+    def is_shallow(self) -> bool:
+        return bool(self.shallow)
+
+    # Objects
+
+    def read_object(self, sha: str) -> Tuple[int, bytes]:
+        try:
+            with self.lock:
+                return self._read_object(sha)
+        except (OSError, ValueError, IndexError, struct.error, zlib.error) as exc:
+            raise UnsupportedRepository(f"cannot read object {sha}: {exc}") from exc
+
+    def _read_object(self, sha: str) -> Tuple[int, bytes]:
+        binsha = bytes.fromhex(sha)
+        for pack in self.packs:
+            offset = pack.index.find(binsha)
+            if offset is not None:
+                return pack.read_at(offset)
+
+        for object_dir in self.object_dirs:
+            path = object_dir / sha[:2] / sha[2:]
+            if path.exists():
+                raw = zlib.decompress(path.read_bytes())
+                header, _, data = raw.partition(b"\x00")
+                type_name, _, size = header.partition(b" ")
+                for obj_type, name in TYPE_NAMES.items():
+                    if name.encode() == type_name:
+                        if int(size) != len(data):
+                            raise UnsupportedRepository(f"loose object {sha} has the wrong size")
+                        return obj_type, data
+                raise UnsupportedRepository(f"unknown loose object type {type_name!r}")
+
+        raise UnsupportedRepository(f"object {sha} not found")
+
+    def has_object(self, sha: str) -> bool:
+        try:
+            self.read_object(sha)
+        except UnsupportedRepository:
+            return False
+        return True
+
+    def commit(self, sha: str) -> Commit:
+        cached = self.commits.get(sha)
+        if cached is not None:
+            return cached
+
+        obj_type, data = self.read_object(sha)
+        if obj_type != OBJ_COMMIT:
+            raise UnsupportedRepository(f"{sha} is not a commit")
+
+        try:
+            commit = self._parse_commit(sha, data)
+        except (ValueError, IndexError) as exc:
+            raise UnsupportedRepository(f"cannot parse commit {sha}: {exc}") from exc
+        self.commits[sha] = commit
+        return commit
+
+    def _parse_commit(self, sha: str, data: bytes) -> Commit:
+        header, _, message = data.partition(b"\n\n")
+        tree = ""
+        parents: List[str] = []
+        author_time = committer_time = 0
+        author_tz = "+0000"
+        encoding = "utf-8"
+        for line in header.split(b"\n"):
+            if line.startswith(b" "):
+                continue  # continuation of a multi-line header (gpgsig, mergetag)
+            key, _, value = line.partition(b" ")
+            if key == b"tree":
+                tree = value.decode("ascii")
+            elif key == b"parent":
+                parents.append(value.decode("ascii"))
+            elif key == b"author":
+                stamp, tz = value.rsplit(b" ", 2)[-2:]
+                author_time, author_tz = int(stamp), tz.decode("ascii")
+            elif key == b"committer":
+                committer_time = int(value.rsplit(b" ", 2)[-2])
+            elif key == b"encoding":
+                encoding = value.decode("ascii")
+
+        if sha in self.shallow:
+            parents = []
+        try:
+            text = message.decode(encoding, errors="replace")
+        except LookupError:
+            raise UnsupportedRepository(f"unknown commit encoding {encoding!r}")
+
+        return Commit(sha, tree, parents, author_time, author_tz, committer_time, text)
+
+    def tree(self, sha: str) -> Dict[str, TreeEntry]:
+        cached = self.trees.get(sha)
+        if cached is not None:
+            return cached
+        if sha == EMPTY_TREE:
+            entries: Dict[str, TreeEntry] = {}
+            self.trees[sha] = entries
+            return entries
+
+        obj_type, data = self.read_object(sha)
+        if obj_type != OBJ_TREE:
+            raise UnsupportedRepository(f"{sha} is not a tree")
+        entries = {}
+        pos = 0
+        try:
+            while pos < len(data):
+                space = data.index(b" ", pos)
+                nul = data.index(b"\x00", space)
+                mode = data[pos:space]
+                name = data[space + 1:nul].decode("utf-8", errors="surrogateescape")
+                entries[name] = TreeEntry(mode, data[nul + 1:nul + 21].hex())
+                pos = nul + 21
+        except ValueError as exc:
+            raise UnsupportedRepository(f"cannot parse tree {sha}: {exc}") from exc
+        self.trees[sha] = entries
+        return entries
+
+    def blob(self, sha: str) -> bytes:
+        obj_type, data = self.read_object(sha)
+        if obj_type != OBJ_BLOB:
+            raise UnsupportedRepository(f"{sha} is not a blob")
+        return data
+
+    def entry_at(self, tree: str, path: str) -> Optional[TreeEntry]:
+        """Look up `path` (slash separated) in `tree`."""
+        entry: Optional[TreeEntry] = TreeEntry(TREE_MODE, tree)
+        for part in path.split("/"):
+            if entry is None or not entry.is_tree:
+                return None
+            entry = self.tree(entry.sha).get(part)
+        return entry
+
+    def list_blobs(self, tree: str) -> List[Tuple[str, TreeEntry]]:
+        """All non-tree entries below `tree`, in git's diff order."""
+        cached = self.blob_lists.get(tree)
+        if cached is not None:
+            return cached
+        entries: List[Tuple[str, TreeEntry]] = []
+        for name, entry in self.tree(tree).items():
+            if entry.is_tree:
+                entries.extend((f"{name}/{path}", sub) for path, sub in self.list_blobs(entry.sha))
+            else:
+                entries.append((name, entry))
+        self.blob_lists[tree] = entries
+        return entries
+
+    def find_identical_source(self, tree: str, new_tree: str, path: str, target: TreeEntry) -> Optional[str]:
+        """
+        Pick the file in `tree` that git's exact rename/copy detection would
+        pair with `target` at `path` in `new_tree`: same blob, preferring a
+        file deleted in `new_tree` (a rename over a copy), then the same
+        basename, then the first in path order.
+        """
+        basename = path.rsplit("/", 1)[-1]
+        best: Optional[str] = None
+        best_score = -1
+        for source_path, entry in self.list_blobs(tree):
+            if entry.sha != target.sha:
+                continue
+            regular = entry.mode.startswith(b"100") and target.mode.startswith(b"100")
+            if not regular and entry.mode != target.mode:
+                continue
+            score = (self.entry_at(new_tree, source_path) is None) + (source_path.rsplit("/", 1)[-1] == basename)
+            if score > best_score:
+                best, best_score = source_path, score
+                if score == 2:
+                    break
+        return best
+
+    def diff_trees(self, old: Optional[str], new: Optional[str], prefix: str = "") -> Iterator[Tuple[str, Optional[TreeEntry], Optional[TreeEntry]]]:
+        """Yield (path, old entry, new entry) for every blob that differs."""
+        if old == new:
+            return
+        old_entries = self.tree(old) if old else {}
+        new_entries = self.tree(new) if new else {}
+        for name in sorted(set(old_entries) | set(new_entries)):
+            before = old_entries.get(name)
+            after = new_entries.get(name)
+            if before == after:
+                continue
+            path = prefix + name
+            old_sub = before.sha if before and before.is_tree else None
+            new_sub = after.sha if after and after.is_tree else None
+            if old_sub or new_sub:
+                yield from self.diff_trees(old_sub, new_sub, path + "/")
+            old_blob = before if before and not before.is_tree else None
+            new_blob = after if after and not after.is_tree else None
+            if old_blob or new_blob:
+                yield path, old_blob, new_blob
+
+    # Walking
+
+    def walk(self, include: Iterable[str], exclude: Iterable[str] = ()) -> Iterator[Commit]:
+        """
+        Yield commits reachable from `include` but not from `exclude`, in the
+        order plain `git log` shows them (newest committer date first).
+        """
+        include = list(include)
+        exclude = list(exclude)
+        if exclude:
+            for sha in self._limited_walk(include, exclude):
+                yield self.commit(sha)
+            return
+
+        counter = itertools.count()
+        queue: List[Tuple[int, int, str]] = []
+        seen: Set[str] = set()
+        for sha in include:
+            if sha not in seen:
+                seen.add(sha)
+                heapq.heappush(queue, (-self.commit(sha).committer_time, next(counter), sha))
+        while queue:
+            _, _, sha = heapq.heappop(queue)
+            commit = self.commit(sha)
+            yield commit
+            for parent in commit.parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    heapq.heappush(queue, (-self.commit(parent).committer_time, next(counter), parent))
+
+    def _limited_walk(self, include: List[str], exclude: List[str]) -> List[str]:
+        """
+        Walk `include` and `exclude` together, painting everything reachable
+        from `exclude` as uninteresting, and stop once only uninteresting
+        commits are left (as git's limit_list does). Returns the interesting
+        commits in the order they were visited.
+        """
+        counter = itertools.count()
+        flags: Dict[str, bool] = {}
+        done: Set[str] = set()
+        visited: List[str] = []
+        queue: List[Tuple[int, int, str]] = []
+
+        def push(sha: str) -> None:
+            heapq.heappush(queue, (-self.commit(sha).committer_time, next(counter), sha))
+
+        def mark(sha: str) -> None:
+            stack = [sha]
+            while stack:
+                current = stack.pop()
+                if flags.get(current):
+                    continue
+                flags[current] = True
+                if current in done:
+                    stack.extend(self.commit(current).parents)
+                else:
+                    push(current)
+
+        for sha in include:
+            if sha not in flags:
+                flags[sha] = False
+                push(sha)
+        for sha in exclude:
+            mark(sha)
+
+        slop = WALK_SLOP
+        while queue:
+            _, _, sha = heapq.heappop(queue)
+            if sha in done:
+                continue
+            done.add(sha)
+            visited.append(sha)
+            for parent in self.commit(sha).parents:
+                if flags[sha]:
+                    mark(parent)
+                elif parent not in flags:
+                    flags[parent] = False
+                    push(parent)
+            if all(flags[item[2]] for item in queue):
+                slop -= 1
+                if slop <= 0:
+                    break
+            else:
+                slop = WALK_SLOP
+
+        return [sha for sha in visited if not flags[sha]]
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        if not self.has_object(ancestor):
+            return False
+        for commit in self.walk([descendant]):
+            if commit.sha == ancestor:
+                return True
+        return False
+
+
+def open_repository(root: Path) -> Repository:
+    """Open the repository at `root`, raising UnsupportedRepository if it cannot be read in-process."""
+    try:
+        return Repository(root)
+    except (OSError, ValueError, struct.error, zlib.error) as exc:
+        raise UnsupportedRepository(str(exc)) from exc
+
+
+def find_repository(start: Path) -> Repository:
+    """Open the repository containing `start`, like git's own discovery."""
+    start = start.resolve()
+    for candidate in [start, *start.parents]:
+        if (candidate / ".git").exists():
+            return open_repository(candidate)
+    raise UnsupportedRepository(f"no git repository found above {start}")
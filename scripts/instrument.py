@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Opt-in instrumentation for the generators, used by
+`run_runtime_generators.py --profile`.
+
+Run as `instrument.py --out DIR SCRIPT`, it runs SCRIPT as __main__ under
+cProfile and, when it exits, writes DIR/<name>.prof and DIR/<name>.json
+with the script's CPU time, peak memory, files and bytes read and written,
+and one event per git process it started (reported through git_call()).
+
+git_call() does nothing unless a script is being profiled.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Sequence, Set
+
+try:
+    import resource
+except ImportError:  # not available on Windows; CPU and memory are skipped
+    resource = None
+
+# Flags of an os.open() call that can modify the file.
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+# Python modules being imported are not counted as files read.
+MODULE_SUFFIXES = (".py", ".pyc", ".so")
+
+
+class Recorder:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.git_calls: List[Dict[str, Any]] = []
+        self.threads: Dict[int, int] = {}
+        self.files_read: Set[str] = set()
+        self.files_written: Set[str] = set()
+        self.active = True
+        self.io_start = read_proc_io()
+
+    def thread(self) -> int:
+        ident = threading.get_ident()
+        with self.lock:
+            return self.threads.setdefault(ident, len(self.threads))
+
+    @contextlib.contextmanager
+    def git_call(self, args: List[str]) -> Iterator[None]:
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            yield
+        finally:
+            event = {
+                "command": " ".join(["git"] + args[:1]),
+                "start": started,
+                "seconds": time.perf_counter() - clock,
+                "thread": self.thread(),
+            }
+            with self.lock:
+                self.git_calls.append(event)
+
+    def audit(self, event: str, args: tuple) -> None:
+        if event != "open" or not self.active:
+            return
+        path, mode, flags = args
+        if not isinstance(path, (str, bytes)):
+            return  # an already open file descriptor
+        name = os.fsdecode(path)
+        if name.startswith("/proc/") or name.endswith(MODULE_SUFFIXES):
+            return
+        if mode is not None:
+            written = any(char in mode for char in "wax+")
+        else:
+            written = bool(flags & WRITE_FLAGS)
+        with self.lock:
+            (self.files_written if written else self.files_read).add(name)
+
+    def summary(self) -> Dict[str, Any]:
+        self.active = False
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "start": self.start,
+            "wall_seconds": time.time() - self.start,
+            "git": {
+                "calls": len(self.git_calls),
+                "seconds": sum(call["seconds"] for call in self.git_calls),
+            },
+            "files_read": len(self.files_read),
+            "files_written": len(self.files_written),
+            "git_calls": self.git_calls,
+        }
+        io_end = read_proc_io()
+        if self.io_start and io_end:
+            # Every read()/write() system call, so pipes from git are included.
+            data["read_bytes"] = io_end["rchar"] - self.io_start["rchar"]
+            data["write_bytes"] = io_end["wchar"] - self.io_start["wchar"]
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            data["cpu_seconds"] = usage.ru_utime + usage.ru_stime
+            # git processes, once they have been waited for.
+            data["child_cpu_seconds"] = children.ru_utime + children.ru_stime
+            # Kilobytes on Linux, bytes on macOS.
+            scale = 1 if sys.platform == "darwin" else 1024
+            data["peak_rss_bytes"] = usage.ru_maxrss * scale
+        return data
+
+
+def read_proc_io() -> Optional[Dict[str, int]]:
+    try:
+        text = Path("/proc/self/io").read_text(encoding="ascii")
+    except OSError:
+        return None
+    counters = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        counters[key] = int(value)
+    return counters
+
+
+_recorder: Optional[Recorder] = None
+
+
+def git_call(args: List[str]) -> ContextManager:
+    """Time one git process started with `args` while a script is profiled."""
+    return _recorder.git_call(args) if _recorder is not None else contextlib.nullcontext()
+
+
+def profile_script(script: Path, out_dir: Path, args: Sequence[str] = ()) -> int:
+    global _recorder
+    name = script.stem
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _recorder = Recorder(name)
+    sys.addaudithook(_recorder.audit)
+
+    sys.argv = [str(script), *args]
+    profiler = cProfile.Profile()
+    code: Any = 0
+    try:
+        profiler.runcall(runpy.run_path, str(script), run_name="__main__")
+    except SystemExit as exc:
+        code = exc.code
+    finally:
+        summary = _recorder.summary()
+        profiler.dump_stats(str(out_dir / f"{name}.prof"))
+        (out_dir / f"{name}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a generator with instrumentation.")
+    parser.add_argument("--out", type=Path, required=True, help="Directory for the .prof and .json files.")
+    parser.add_argument("script", type=Path, help="Generator script to run.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the script.")
+    args = parser.parse_args()
+    return profile_script(args.script, args.out, args.args)
+
+
+if __name__ == "__main__":
+    # The script imports this file as `instrument`, not `__main__`; use that
+    # copy so its git_call() sees the recorder.
+    import instrument
+
+    sys.exit(instrument.main())
@@ -0,0 +1,26 @@
+// Render math to HTML at build time for `mdbook-math.py`.
+//
+// Usage: node katex-prerender.js path/to/katex.min.js < formulas.json
+//
+// Reads a JSON array of [tex, displayMode] pairs on stdin and writes a JSON
+// array with the HTML for each, or null when KaTeX can't parse it (those are
+// left for katex-render.js to render, with its error display, in the browser).
+"use strict";
+
+const katex = require(require("path").resolve(process.argv[2]));
+
+let input = "";
+process.stdin.setEncoding("utf8");
+process.stdin.on("data", (chunk) => {
+  input += chunk;
+});
+process.stdin.on("end", () => {
+  const rendered = JSON.parse(input).map(([tex, displayMode]) => {
+    try {
+      return katex.renderToString(tex, { displayMode, throwOnError: true });
+    } catch (err) {
+      return null;
+    }
+  });
+  process.stdout.write(JSON.stringify(rendered));
+});
@@ -7,6 +7,7 @@
     const inline = document.querySelectorAll(".math-inline");
     const block = document.querySelectorAll(".math-block");
 
+    // Math pre-rendered by mdbook-math.py has no data-tex and is skipped.
     inline.forEach((el) => {
       const tex = el.getAttribute("data-tex");
       if (!tex) return;
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Run markdownlint and remark over the docs in parallel.
+
+The files to lint (every docs/**/*.md, the paths given, or with
+--base-sha/--head-sha the ones lint_targets.py selects) are split into
+--jobs shards of about the same total size. Each linter runs once per
+shard, the shards run concurrently (after one run per linter, so that npx
+installs each linter once), and the diagnostics of all runs are printed as
+one report ordered by file, line, column and linter.
+
+Results of files that haven't changed since they were last linted, with
+the same linter setup, are replayed from .cache/lint.json (see
+lint_cache.py) instead; --no-cache lints everything.
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from lint_cache import DEFAULT_LINT_CACHE, LINTERS, LintCache
+from lint_targets import lint_targets
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "docs"
+
+# markdownlint-cli2: `docs/a.md:12:3 MD001/heading-increment Heading levels ...`
+MARKDOWNLINT_RE = re.compile(r"^(?P<path>[^\s:][^:]*):(?P<line>\d+)(?::(?P<column>\d+))? (?P<message>.+)$")
+# remark, under a line naming the file: `  12:3-12:9  warning  Message  rule  source`
+REMARK_RE = re.compile(
+    r"^\s*(?P<line>\d+):(?P<column>\d+)(?:-\d+:\d+)?\s+(?:warning|error|info)\s+(?P<message>.+?)\s*$"
+)
+
+
+@dataclass(frozen=True, order=True)
+class Diagnostic:
+    path: str
+    line: int
+    column: int
+    linter: str
+    message: str
+
+    def format(self) -> str:
+        return f"{self.path}:{self.line}:{self.column} [{self.linter}] {self.message}"
+
+
+@dataclass
+class ShardResult:
+    linter: str
+    files: List[str]
+    returncode: int
+    output: str
+    diagnostics: List[Diagnostic]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Lint the docs with markdownlint and remark in parallel.")
+    parser.add_argument("files", nargs="*", help="Files to lint (default: every docs/**/*.md).")
+    parser.add_argument("--base-sha", help="Lint the files lint_targets.py selects between --base-sha and --head-sha.")
+    parser.add_argument("--head-sha", help="See --base-sha.")
+    parser.add_argument(
+        "--linter",
+        action="append",
+        choices=sorted(LINTERS),
+        help="Linter to run; repeat for several (default: all).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of shards, and of linter processes running at once (default: CPU count).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Lint every file, ignoring and not updating the lint cache.",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if (args.base_sha is None) != (args.head_sha is None):
+        parser.error("--base-sha and --head-sha must be given together")
+    if args.base_sha and args.files:
+        parser.error("give either files or --base-sha/--head-sha")
+    return args
+
+
+def shard(files: List[str], count: int) -> List[List[str]]:
+    """
+    Split `files` into at most `count` shards of about the same total size,
+    placing the largest files first, each onto the currently smallest shard.
+    """
+    shards: List[List[str]] = [[] for _ in range(min(count, len(files)))]
+    heap: List[Tuple[int, int]] = [(0, idx) for idx in range(len(shards))]
+    sized = sorted(((ROOT / path).stat().st_size, path) for path in files)
+    for size, path in reversed(sized):
+        total, idx = heapq.heappop(heap)
+        shards[idx].append(path)
+        heapq.heappush(heap, (total + size, idx))
+    return [sorted(files) for files in shards]
+
+
+def parse_markdownlint(output: str, files: List[str]) -> List[Diagnostic]:
+    known = set(files)
+    diagnostics = []
+    for line in output.splitlines():
+        match = MARKDOWNLINT_RE.match(line)
+        if match and match.group("path") in known:
+            diagnostics.append(
+                Diagnostic(
+                    path=match.group("path"),
+                    line=int(match.group("line")),
+                    column=int(match.group("column") or 1),
+                    linter="markdownlint",
+                    message=match.group("message"),
+                )
+            )
+    return diagnostics
+
+
+def parse_remark(output: str, files: List[str]) -> List[Diagnostic]:
+    known = set(files)
+    diagnostics = []
+    current: Optional[str] = None
+    for line in output.splitlines():
+        name = line.strip().split(": ", 1)[0]
+        if name in known:
+            current = name
+            continue
+        match = REMARK_RE.match(line)
+        if match and current is not None:
+            diagnostics.append(
+                Diagnostic(
+                    path=current,
+                    line=int(match.group("line")),
+                    column=int(match.group("column")),
+                    linter="remark",
+                    message=re.sub(r"\s{2,}", " ", match.group("message")),
+                )
+            )
+    return diagnostics
+
+
+PARSERS = {"markdownlint": parse_markdownlint, "remark": parse_remark}
+
+
+def run_shard(linter: str, files: List[str]) -> ShardResult:
+    try:
+        result = subprocess.run(
+            LINTERS[linter] + files,
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding="utf-8",
+            errors="replace",
+        )
+    except OSError as exc:
+        return ShardResult(linter, files, 127, str(exc), [])
+    return ShardResult(linter, files, result.returncode, result.stdout, PARSERS[linter](result.stdout, files))
+
+
+def select_files(args: argparse.Namespace) -> List[str]:
+    if args.base_sha:
+        return lint_targets(args.base_sha, args.head_sha)
+    if args.files:
+        return sorted({Path(path).resolve().relative_to(ROOT).as_posix() for path in args.files})
+    return sorted(path.relative_to(ROOT).as_posix() for path in DOCS.rglob("*.md"))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    files = select_files(args)
+    if not files:
+        print("[OK] no Markdown files to lint")
+        return 0
+
+    linters = args.linter or sorted(LINTERS)
+    cache = None if args.no_cache else LintCache(DEFAULT_LINT_CACHE)
+    diagnostics: List[Diagnostic] = []
+    runs: List[Tuple[str, List[str]]] = []
+    for linter in linters:
+        pending = []
+        for path in files:
+            cached = cache.get(linter, ROOT / path) if cache else None
+            if cached is None:
+                pending.append(path)
+                continue
+            diagnostics.extend(Diagnostic(path, line, column, linter, message) for line, column, message in cached)
+        runs.extend((linter, batch) for batch in shard(pending, args.jobs))
+    print(
+        f"[LINT] {len(files)} file(s), {len(runs)} linter run(s): {', '.join(linters)}"
+        + (f"; {cache.hits} result(s) from the cache" if cache else ""),
+        file=sys.stderr,
+    )
+    # The first run of each linter goes alone, so that npx fetches a
+    # missing package once instead of in every concurrent process.
+    first: List[Tuple[str, List[str]]] = []
+    rest: List[Tuple[str, List[str]]] = []
+    for run in runs:
+        (rest if any(linter == run[0] for linter, _ in first) else first).append(run)
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(lambda run: run_shard(*run), first))
+        results += pool.map(lambda run: run_shard(*run), rest)
+
+    for result in results:
+        diagnostics.extend(result.diagnostics)
+        if cache is None:
+            continue
+        found: Dict[str, List[Tuple[int, int, str]]] = {path: [] for path in result.files}
+        for diagnostic in result.diagnostics:
+            found[diagnostic.path].append((diagnostic.line, diagnostic.column, diagnostic.message))
+        for path, reported in found.items():
+            # A failed run only vouches for the files it reported on; the
+            # others may have hit an error we couldn't parse.
+            if result.returncode == 0 or reported:
+                cache.put(result.linter, ROOT / path, reported)
+    if cache is not None:
+        cache.save()
+
+    diagnostics.sort()
+    for diagnostic in diagnostics:
+        print(diagnostic.format())
+
+    # A linter that failed without reporting anything we understood has
+    # crashed or is missing; show what it printed.
+    crashed = [result for result in results if result.returncode != 0 and not result.diagnostics]
+    for result in crashed:
+        print(f"[ERROR] {result.linter} exited with code {result.returncode} on {len(result.files)} file(s):")
+        print(result.output.rstrip())
+
+    if diagnostics or crashed:
+        problem_files = len({diagnostic.path for diagnostic in diagnostics})
+        print(
+            f"[FAIL] {len(diagnostics)} problem(s) in {problem_files} file(s)"
+            + (f", {len(crashed)} linter run(s) failed" if crashed else "")
+        )
+        return 1
+    print(f"[OK] {len(files)} file(s) passed {', '.join(linters)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+The linters scripts/lint.py runs, and a cache of their results per file.
+
+A file's diagnostics from one linter are stored under a hash of the file's
+bytes and of the linter's setup: its command line (which pins the
+markdownlint-cli2 version), its config file and, for remark, the
+package-lock.json pinning its plugins. An unchanged file linted with an
+unchanged setup is then replayed from the cache instead of linted again,
+and lint_targets.py can leave out files that are known to be clean.
+
+The cache keeps the most recently used `max_entries` results.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from build_cache import write_if_changed
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LINT_CACHE = ROOT / ".cache" / "lint.json"
+LINT_CACHE_VERSION = 1
+DEFAULT_MAX_ENTRIES = 20000
+
+# Each is run from the repository root with the files to lint appended.
+LINTERS: Dict[str, List[str]] = {
+    "markdownlint": ["npx", "markdownlint-cli2@0.12.1", "--config", ".markdownlint.yaml"],
+    "remark": ["npx", "remark", "--frail", "--quiet", "--no-stdout", "--no-color", "--rc-path", ".remarkrc.mjs"],
+}
+# Files besides the command line that decide what a linter reports.
+LINTER_CONFIGS: Dict[str, List[str]] = {
+    "markdownlint": [".markdownlint.yaml"],
+    "remark": [".remarkrc.mjs", "package-lock.json"],
+}
+
+# (line, column, message) of one diagnostic.
+Result = List[Tuple[int, int, str]]
+
+
+def setup_digest(linter: str) -> str:
+    digest = hashlib.sha256(json.dumps(LINTERS[linter]).encode("utf-8"))
+    for name in LINTER_CONFIGS[linter]:
+        path = ROOT / name
+        data = path.read_bytes() if path.is_file() else b"missing"
+        digest.update(name.encode("utf-8") + b"\0" + data + b"\0")
+    return digest.hexdigest()
+
+
+class LintCache:
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.setups = {linter: setup_digest(linter) for linter in LINTERS}
+        self.file_digests: Dict[Path, str] = {}
+        # key -> {"diagnostics": [[line, column, message], ...], "used": time}
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == LINT_CACHE_VERSION:
+            self.entries = data.get("entries", {})
+
+    def key(self, linter: str, path: Path) -> str:
+        if path not in self.file_digests:
+            self.file_digests[path] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return hashlib.sha256(f"{self.setups[linter]}\0{self.file_digests[path]}".encode("utf-8")).hexdigest()
+
+    def get(self, linter: str, path: Path) -> Optional[Result]:
+        entry = self.entries.get(self.key(linter, path))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["used"] = time.time()
+        return [(line, column, message) for line, column, message in entry["diagnostics"]]
+
+    def put(self, linter: str, path: Path, diagnostics: Result) -> None:
+        self.entries[self.key(linter, path)] = {
+            "diagnostics": [list(diagnostic) for diagnostic in diagnostics],
+            "used": time.time(),
+        }
+
+    def clean(self, path: Path) -> bool:
+        """Whether every linter is known to report nothing for `path` as it is now."""
+        return all(self.get(linter, path) == [] for linter in LINTERS)
+
+    def save(self) -> None:
+        entries = sorted(self.entries.items(), key=lambda item: item[1]["used"], reverse=True)
+        data = {"version": LINT_CACHE_VERSION, "entries": dict(sorted(entries[: self.max_entries]))}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.path, json.dumps(data).encode("utf-8"))
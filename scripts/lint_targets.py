@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
-"""List changed non-raw Markdown files under docs/ for linting."""
+"""
+List changed non-raw Markdown files under docs/ for linting.
+
+Files the lint cache (see lint_cache.py) already knows to be clean, as
+they are now, for every linter are left out unless --no-cache is given.
+"""
 
 from __future__ import annotations
 
 import argparse
-import re
 import subprocess
 import sys
 from pathlib import Path
 
-RAW_STATUS_RE = re.compile(r"^\|\s*status\s*\|\s*raw\s*\|$", re.IGNORECASE)
+from lint_cache import DEFAULT_LINT_CACHE, LintCache
+from spec_header import scan_header
 
 
 def parse_args() -> argparse.Namespace:
@@ -17,6 +22,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--base-sha", required=True, help="Base commit SHA")
     parser.add_argument("--head-sha", required=True, help="Head commit SHA")
     parser.add_argument("--output", help="Write targets to this file")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the lint cache; select every changed file for re-linting")
     return parser.parse_args()
 
 
@@ -38,17 +44,13 @@ def is_in_raw_dir(path: Path) -> bool:
 
 def has_raw_status(path: Path) -> bool:
     try:
-        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+        header = scan_header(path)
     except OSError:
         return False
-
-    for line in lines[:220]:
-        if RAW_STATUS_RE.match(line.strip()):
-            return True
-    return False
+    return header.meta().get("status", "").lower() == "raw"
 
 
-def lint_targets(base_sha: str, head_sha: str) -> list[str]:
+def lint_targets(base_sha: str, head_sha: str, cache: LintCache | None = None) -> list[str]:
     targets: list[str] = []
     skipped = 0
     for rel_path in changed_files(base_sha, head_sha):
@@ -69,6 +71,10 @@ def lint_targets(base_sha: str, head_sha: str) -> list[str]:
             skipped += 1
             log(f"SKIP   {rel_path} (metadata status is raw)")
             continue
+        if cache is not None and cache.clean(path):
+            skipped += 1
+            log(f"SKIP   {rel_path} (clean in the lint cache)")
+            continue
         targets.append(rel_path)
         log(f"SELECT {rel_path}")
 
@@ -79,7 +85,8 @@ def lint_targets(base_sha: str, head_sha: str) -> list[str]:
 
 def main() -> int:
     args = parse_args()
-    targets = lint_targets(args.base_sha, args.head_sha)
+    cache = None if args.no_cache else LintCache(DEFAULT_LINT_CACHE)
+    targets = lint_targets(args.base_sha, args.head_sha, cache)
     output = "\n".join(targets)
 
     if args.output:
@@ -1,77 +1,508 @@
 #!/usr/bin/env python3
+import hashlib
 import html
 import json
+import os
 import re
+import subprocess
 import sys
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from build_cache import script_digest, write_if_changed
 
-FENCED_CODE_RE = re.compile(r"```[\s\S]*?```|~~~[\s\S]*?~~~")
-INLINE_CODE_RE = re.compile(r"`+[^`\n]*?`+")
-BLOCK_MATH_RE = re.compile(r"(?<!\\)\$\$(.+?)(?<!\\)\$\$", re.DOTALL)
-INLINE_MATH_RE = re.compile(r"(?<!\\)\$(?!\$)([^\n]*?)(?<!\\)\$")
-ALT_BLOCK_MATH_RE = re.compile(
-    r"(?<!\\)\$`\s*\n(.+?)\n\s*`\$(?!\$)",
-    re.DOTALL,
-)
+ROOT = Path(__file__).resolve().parent.parent
+KATEX_JS = ROOT / "theme" / "katex" / "katex.min.js"
+PRERENDER_JS = ROOT / "scripts" / "katex-prerender.js"
+DEFAULT_KATEX_CACHE = ".cache/katex"
+DEFAULT_CHAPTER_CACHE = ".cache/mdbook-math"
+DEFAULT_CHAPTER_CACHE_MB = 64
+# Below this much Markdown in total, starting worker processes costs more
+# than scanning the chapters one after another.
+PARALLEL_MIN_CHARS = 500_000
 
+FENCES = ("```", "~~~")
+TAG_RE = re.compile(r"(<[^>]*>)")
+# Characters in KaTeX's text that Markdown would otherwise interpret, e.g.
+# the TeX source in its MathML annotation, or `|` in a table row.
+MARKDOWN_CHARS = {ord(char): f"&#{ord(char)};" for char in "\\`*_[]~|\n"}
 
-def protect(text: str, pattern: re.Pattern, store: List[str], prefix: str) -> str:
-    def repl(match: re.Match) -> str:
-        key = f"{prefix}{len(store)}@@"
-        store.append(match.group(0))
-        return key
 
-    return pattern.sub(repl, text)
+def encode_attr(content: str) -> str:
+    encoded = html.escape(content, quote=True)
+    return encoded.replace("\n", "&#10;")
 
 
-def restore(text: str, store: List[str], prefix: str) -> str:
-    for idx, value in enumerate(store):
-        text = text.replace(f"{prefix}{idx}@@", value)
-    return text
+@dataclass(frozen=True)
+class Math:
+    tex: str
+    # `tex` as written into data-tex: code spans in it are copied as they are.
+    attr: str
+    display: bool
 
 
-def encode_attr(content: str) -> str:
-    encoded = html.escape(content, quote=True)
-    return encoded.replace("\n", "&#10;")
+def markup(math: Math, rendered: Optional[str] = None) -> str:
+    """
+    The element for `math`: KaTeX's HTML when it was pre-rendered, or an
+    empty element that katex-render.js renders from data-tex in the browser.
+    """
+    tag, kind = ("div", "math-block") if math.display else ("span", "math-inline")
+    if rendered is not None:
+        return f"<{tag} class=\"{kind}\">{rendered}</{tag}>"
+    return f"<{tag} class=\"{kind}\" data-tex=\"{math.attr}\"></{tag}>"
 
 
-def render_block(match: re.Match) -> str:
-    content = match.group(1).strip("\n")
-    encoded = encode_attr(content)
-    return f"<div class=\"math-block\" data-tex=\"{encoded}\"></div>"
+def for_markdown(rendered: str) -> str:
+    """KaTeX HTML made safe to embed in Markdown, which mdBook renders after us."""
+    parts = TAG_RE.split(rendered)
+    return "".join(
+        part.replace("\n", " ") if idx % 2 else part.translate(MARKDOWN_CHARS)
+        for idx, part in enumerate(parts)
+    )
 
 
-def render_inline(match: re.Match) -> str:
-    content = match.group(1)
-    encoded = encode_attr(content)
-    return f"<span class=\"math-inline\" data-tex=\"{encoded}\"></span>"
+class Scanner:
+    """
+    Rewrite the math in one chapter in a single left-to-right pass.
 
+    Fenced code (from ``` or ~~~ to the next identical fence, anywhere in
+    the text) and inline code spans are kept verbatim and never hold math;
+    they may sit inside a math span, in which case they are copied into its
+    `data-tex` unescaped. Math is `$`\n...\n`$` or `$$...$$` (rendered as
+    blocks) or `$...$` on one line (inline); a `$` right after a backslash
+    never opens or closes math.
+
+    Every attempt that fails records how far no closing delimiter exists,
+    so later attempts stop there, and code spans are only measured once:
+    the whole pass is linear in the length of the chapter.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.size = len(text)
+        self.code_ends: Dict[int, Optional[int]] = {}
+        # Per fence, where one was found without a closing fence after it.
+        self.unclosed_fences: Dict[str, int] = {}
+        # Positions before which no closing delimiter can be found.
+        self.no_inline_close_before = -1
+        self.no_block_close_from = self.size + 1
+        self.no_alt_close_from = self.size + 1
+        # Code spans of the math span being scanned.
+        self.spans: List[Tuple[int, int]] = []
+
+    def fence_end(self, pos: int) -> Optional[int]:
+        text = self.text
+        for fence in FENCES:
+            if text.startswith(fence, pos) and pos < self.unclosed_fences.get(fence, self.size):
+                close = text.find(fence, pos + 3)
+                if close == -1:
+                    self.unclosed_fences[fence] = pos
+                    return None
+                return close + 3
+        return None
+
+    def code_end(self, pos: int) -> Optional[int]:
+        """End of the fenced block or inline code span starting at `pos`, if any."""
+        if pos in self.code_ends:
+            return self.code_ends[pos]
+        end = self.fence_end(pos)
+        if end is None and self.text[pos] == "`":
+            end = self.inline_code_end(pos)
+        self.code_ends[pos] = end
+        return end
+
+    def inline_code_end(self, pos: int) -> Optional[int]:
+        text, size = self.text, self.size
+        run = pos
+        while run < size and text[run] == "`":
+            run += 1
+        cur = run
+        while cur < size and text[cur] != "\n":
+            if text[cur] in "`~":
+                end = self.fence_end(cur)
+                if end is not None:
+                    cur = end
+                    continue
+                if text[cur] == "`":
+                    while cur < size and text[cur] == "`":
+                        cur += 1
+                    return cur
+            cur += 1
+        # No closing run on this line: a run of two or more backticks
+        # still closes itself.
+        return run if run - pos >= 2 else None
+
+    def skip_code(self, pos: int) -> int:
+        """`pos`, or the end of the code at `pos`, which is recorded in `spans`."""
+        if self.text[pos] in "`~":
+            end = self.code_end(pos)
+            if end is not None:
+                self.spans.append((pos, end))
+                return end
+        return pos
+
+    def next_unit(self, pos: int) -> int:
+        end = self.skip_code(pos)
+        return end if end != pos else pos + 1
+
+    def closes(self, pos: int, delimiter: str) -> bool:
+        return self.text.startswith(delimiter, pos) and self.text[pos - 1] != "\\"
+
+    def inline_close(self, start: int) -> Optional[int]:
+        """Position of the `$` closing inline math whose content starts at `start`."""
+        text, size = self.text, self.size
+        if start < self.no_inline_close_before:
+            return None
+        cur = start
+        while cur < size and text[cur] != "\n":
+            end = self.skip_code(cur)
+            if end != cur:
+                cur = end
+            elif text[cur] == "$" and self.closes(cur, "$"):
+                return cur
+            else:
+                cur += 1
+        self.no_inline_close_before = cur
+        return None
+
+    def block_close(self, start: int) -> Optional[int]:
+        """Position of the `$$` closing block math whose content starts at `start`."""
+        if start >= self.size or start >= self.no_block_close_from:
+            return None
+        cur = self.next_unit(start)
+        while cur < self.size:
+            end = self.skip_code(cur)
+            if end != cur:
+                cur = end
+            elif self.closes(cur, "$$"):
+                return cur
+            else:
+                cur += 1
+        self.no_block_close_from = start
+        return None
+
+    def alt_closing(self, newline: int) -> Optional[int]:
+        """
+        End of the whitespace after `newline`, if `$` (not an inline code
+        span, not followed by another `$`) comes right after it.
+        """
+        text, size = self.text, self.size
+        cur = newline
+        while cur < size and text[cur].isspace():
+            cur += 1
+        if (
+            text.startswith("`$", cur)
+            and not text.startswith("$", cur + 2)
+            and self.code_end(cur) is None
+        ):
+            return cur
+        return None
+
+    def alt_close(self, start: int) -> Tuple[Optional[int], int]:
+        """
+        (newline ending the content, position after the whitespace) of the
+        `$` closing alternate block math whose content starts at `start`.
+        """
+        text, size = self.text, self.size
+        if start >= size or start >= self.no_alt_close_from:
+            return None, 0
+        cur = self.next_unit(start)
+        while cur < size:
+            end = self.skip_code(cur)
+            if end != cur:
+                cur = end
+            elif text[cur] == "\n":
+                after = self.alt_closing(cur)
+                if after is not None:
+                    return cur, after
+                # Every newline up to the end of this whitespace fails too.
+                while cur < size and text[cur].isspace():
+                    cur += 1
+            else:
+                cur += 1
+        self.no_alt_close_from = start
+        return None, 0
+
+    def alt_block(self, pos: int) -> Optional[Tuple[int, int, int]]:
+        """(content start, content end, match end) of `$`\n...\n`$` at `pos`."""
+        text, size = self.text, self.size
+        cur = pos + 2
+        newlines = []
+        while cur < size and text[cur].isspace():
+            if text[cur] == "\n":
+                newlines.append(cur)
+            cur += 1
+        if not newlines:
+            return None
+        mark = len(self.spans)
+        close, after = self.alt_close(newlines[-1] + 1)
+        if close is not None:
+            return newlines[-1] + 1, close, after + 2
+        del self.spans[mark:]
+        # As the regex would backtrack: content made of the whitespace
+        # itself, closed by a later newline in it, when the closing `$
+        # comes right after it.
+        after = self.alt_closing(newlines[-1])
+        if after is None:
+            return None
+        for idx in range(len(newlines) - 2, -1, -1):
+            for later in newlines[idx + 1:]:
+                if later >= newlines[idx] + 2:
+                    return newlines[idx] + 1, later, after + 2
+        return None
+
+    def math(self, start: int, end: int, block: bool) -> Math:
+        """The math with content text[start:end], given its code spans in `spans`."""
+        pieces: List[Tuple[bool, str]] = []
+        cur = start
+        for span_start, span_end in self.spans:
+            if span_start > cur:
+                pieces.append((False, self.text[cur:span_start]))
+            pieces.append((True, self.text[span_start:span_end]))
+            cur = span_end
+        if end > cur:
+            pieces.append((False, self.text[cur:end]))
+        self.spans = []
+
+        if block:
+            if pieces and not pieces[0][0]:
+                pieces[0] = (False, pieces[0][1].lstrip("\n"))
+            if pieces and not pieces[-1][0]:
+                pieces[-1] = (False, pieces[-1][1].rstrip("\n"))
+        return Math(
+            tex="".join(text for _, text in pieces),
+            attr="".join(text if is_code else encode_attr(text) for is_code, text in pieces),
+            display=block,
+        )
+
+    def scan(self) -> List[Union[str, Math]]:
+        """The chapter split into Markdown and the math between it."""
+        text, size = self.text, self.size
+        out: List[Union[str, Math]] = []
+        copied = 0
+        cur = 0
+        while cur < size:
+            char = text[cur]
+            if char in "`~":
+                end = self.code_end(cur)
+                cur = end if end is not None else cur + 1
+                continue
+            if char != "$" or (cur > 0 and text[cur - 1] == "\\"):
+                cur += 1
+                continue
+
+            following = text[cur + 1:cur + 2]
+            match: Optional[Tuple[int, int, int, bool]] = None
+            self.spans = []
+            if following == "`" and self.code_end(cur + 1) is None:
+                alt = self.alt_block(cur)
+                if alt is not None:
+                    match = (alt[0], alt[1], alt[2], True)
+            if following == "$":
+                close = self.block_close(cur + 2)
+                if close is not None:
+                    match = (cur + 2, close, close + 2, True)
+            elif match is None:
+                close = self.inline_close(cur + 1)
+                if close is not None:
+                    match = (cur + 1, close, close + 1, False)
+
+            if match is None:
+                self.spans = []
+                cur += 1
+                continue
+            content_start, content_end, match_end, block = match
+            out.append(text[copied:cur])
+            out.append(self.math(content_start, content_end, block))
+            cur = copied = match_end
+
+        out.append(text[copied:])
+        return out
 
-def transform(content: str) -> str:
-    code_blocks: List[str] = []
-    inline_codes: List[str] = []
 
-    content = protect(content, FENCED_CODE_RE, code_blocks, "@@CODEBLOCK")
-    content = protect(content, INLINE_CODE_RE, inline_codes, "@@INLINECODE")
+class Prerenderer:
+    """
+    KaTeX's HTML for each distinct formula, rendered at build time by node
+    with the bundled katex.min.js, all misses in one node process.
 
-    content = ALT_BLOCK_MATH_RE.sub(render_block, content)
-    content = BLOCK_MATH_RE.sub(render_block, content)
-    content = INLINE_MATH_RE.sub(render_inline, content)
+    Every formula is kept in its own file in `cache_dir`, named by a hash of
+    its TeX and display mode, under a directory for the katex.min.js build
+    that rendered it. Formulas KaTeX rejects, or all of them when node can't
+    run, are left to katex-render.js in the browser.
+    """
 
-    content = restore(content, inline_codes, "@@INLINECODE")
-    content = restore(content, code_blocks, "@@CODEBLOCK")
+    def __init__(self, cache_dir: Path, node: str) -> None:
+        self.katex_digest = hashlib.sha256(KATEX_JS.read_bytes()).hexdigest()[:16]
+        self.cache_dir = cache_dir / self.katex_digest
+        self.node = node
+        self.rendered: Dict[Tuple[str, bool], Optional[str]] = {}
+        self.cached = 0
 
-    return content
+    def path(self, tex: str, display: bool) -> Path:
+        mode = "display" if display else "inline"
+        key = hashlib.sha256(f"{mode}\0{tex}".encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.html"
 
+    def prepare(self, maths: Iterable[Math]) -> None:
+        missing: List[Tuple[str, bool]] = []
+        for math in maths:
+            formula = (math.tex, math.display)
+            if formula in self.rendered:
+                continue
+            try:
+                self.rendered[formula] = self.path(*formula).read_text(encoding="utf-8")
+                self.cached += 1
+            except OSError:
+                self.rendered[formula] = None
+                missing.append(formula)
+        if missing:
+            self.render(missing)
+        left = sum(1 for rendered in self.rendered.values() if rendered is None)
+        print(
+            f"[mdbook-math] {len(self.rendered)} formulas: {self.cached} cached, "
+            f"{len(missing) - left} rendered, {left} left for the browser",
+            file=sys.stderr,
+        )
 
-def process_item(item: Dict) -> None:
-    if "Chapter" in item:
-        chapter = item["Chapter"]
-        if "content" in chapter and chapter["content"]:
-            chapter["content"] = transform(chapter["content"])
-        for sub in chapter.get("sub_items", []):
-            process_item(sub)
+    def render(self, formulas: List[Tuple[str, bool]]) -> None:
+        cmd = [self.node, str(PRERENDER_JS), str(KATEX_JS)]
+        try:
+            result = subprocess.run(
+                cmd,
+                input=json.dumps(formulas),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+            )
+        except OSError as exc:
+            print(f"[mdbook-math] Can't run {self.node}: {exc}", file=sys.stderr)
+            return
+        if result.returncode != 0:
+            print(f"[mdbook-math] KaTeX pre-rendering failed:\n{result.stderr}", file=sys.stderr)
+            return
+        for formula, rendered in zip(formulas, json.loads(result.stdout)):
+            if rendered is None:
+                continue
+            rendered = for_markdown(rendered)
+            path = self.path(*formula)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(path, rendered.encode("utf-8"))
+            self.rendered[formula] = rendered
+
+    def get(self, math: Math) -> Optional[str]:
+        return self.rendered.get((math.tex, math.display))
+
+
+class ChapterCache:
+    """
+    Transformed chapters from earlier runs, so `mdbook serve` rebuilds only
+    scan the chapters that changed. Each is kept in its own file in
+    `cache_dir`, named by a hash of the chapter's Markdown and `version`
+    (this preprocessor's code and, when pre-rendering, the KaTeX build).
+
+    A file's mtime is bumped whenever it is used, and once the files take
+    more than `max_bytes` the least recently used ones are removed.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, version: str) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def path(self, content: str) -> Path:
+        key = hashlib.sha256(f"{self.version}\0{content}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.md"
+
+    def get(self, content: str) -> Optional[str]:
+        path = self.path(content)
+        try:
+            output = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return output
+
+    def put(self, content: str, output: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.path(content), output.encode("utf-8"))
+
+    def evict(self) -> int:
+        """Remove the least recently used chapters until the rest fit; return their total size."""
+        entries = []
+        for path in self.cache_dir.glob("*.md"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evicted += 1
+        return total
+
+    def report(self) -> None:
+        total = self.evict()
+        print(
+            f"[mdbook-math] {self.hits + self.misses} chapters: {self.hits} cached, "
+            f"{self.misses} transformed; cache {total / 1e6:.1f} MB, {self.evicted} evicted",
+            file=sys.stderr,
+        )
+
+
+def assemble(parts: List[Union[str, Math]], prerenderer: Optional[Prerenderer] = None) -> str:
+    return "".join(
+        part if isinstance(part, str) else markup(part, prerenderer.get(part) if prerenderer else None)
+        for part in parts
+    )
+
+
+def scan(content: str) -> List[Union[str, Math]]:
+    return Scanner(content).scan()
+
+
+def scan_all(contents: List[str], jobs: int) -> List[List[Union[str, Math]]]:
+    """Scan every chapter, in `jobs` processes when there is enough to share out."""
+    jobs = min(jobs, len(contents))
+    if jobs > 1 and sum(len(content) for content in contents) >= PARALLEL_MIN_CHARS:
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                return list(pool.map(scan, contents, chunksize=max(1, len(contents) // (jobs * 4))))
+        except OSError as exc:
+            print(f"[mdbook-math] Process pool unavailable ({exc}); scanning serially", file=sys.stderr)
+    return [scan(content) for content in contents]
+
+
+def transform(content: str) -> str:
+    return assemble(scan(content))
+
+
+def chapters(items: List[Dict]) -> Iterator[Dict]:
+    for item in items:
+        if "Chapter" in item:
+            chapter = item["Chapter"]
+            if "content" in chapter and chapter["content"]:
+                yield chapter
+            yield from chapters(chapter.get("sub_items", []))
+
+
+def enabled(value) -> bool:
+    # Also take strings and numbers, e.g. from MDBOOK_PREPROCESSOR__MATH__PRERENDER=1.
+    return value is True or str(value).lower() in ("true", "1", "yes")
 
 
 def main() -> int:
@@ -79,14 +510,50 @@ def main() -> int:
         return 0
 
     data = json.load(sys.stdin)
+    context: Dict = {}
     if isinstance(data, list) and len(data) == 2:
-        book = data[1]
+        context, book = data
     elif isinstance(data, dict):
         book = data.get("book", {})
     else:
         book = {}
-    for section in book.get("sections", []):
-        process_item(section)
+    config = context.get("config", {}).get("preprocessor", {}).get("math", {})
+
+    root = Path(context.get("root", "."))
+    prerenderer = None
+    version = script_digest(Path(__file__))
+    if enabled(config.get("prerender", False)):
+        prerenderer = Prerenderer(root / config.get("cache-dir", DEFAULT_KATEX_CACHE), config.get("node", "node"))
+        version += hashlib.sha256(PRERENDER_JS.read_bytes()).hexdigest() + prerenderer.katex_digest
+    cache = None
+    chapter_cache = config.get("chapter-cache", DEFAULT_CHAPTER_CACHE)
+    if chapter_cache is not False:
+        max_bytes = int(float(config.get("chapter-cache-mb", DEFAULT_CHAPTER_CACHE_MB)) * 1e6)
+        cache = ChapterCache(root / chapter_cache, max_bytes, version)
+
+    found = []
+    for chapter in chapters(book.get("sections", [])):
+        output = cache.get(chapter["content"]) if cache else None
+        if output is None:
+            found.append(chapter)
+        else:
+            chapter["content"] = output
+
+    jobs = int(config.get("jobs", os.cpu_count() or 1))
+    parts = scan_all([chapter["content"] for chapter in found], jobs)
+    if prerenderer is not None and found:
+        prerenderer.prepare(part for chapter_parts in parts for part in chapter_parts if isinstance(part, Math))
+    for chapter, chapter_parts in zip(found, parts):
+        output = assemble(chapter_parts, prerenderer)
+        # Math left for the browser may pre-render next time, e.g. once node is installed.
+        complete = prerenderer is None or all(
+            prerenderer.get(part) is not None for part in chapter_parts if isinstance(part, Math)
+        )
+        if cache is not None and complete:
+            cache.put(chapter["content"], output)
+        chapter["content"] = output
+    if cache is not None:
+        cache.report()
 
     json.dump(book, sys.stdout)
     return 0
@@ -443,8 +443,16 @@
     return !hiddenByDefaultStatuses.has(status);
   }
 
+  function inComponent(item) {
+    return componentFilter === "all" || item.component === componentFilter;
+  }
+
+  function componentData() {
+    return rfcData.filter(inComponent);
+  }
+
   function currentTotal() {
-    return rfcData.filter((item) => isVisibleInCurrent(normalizeStatus(item.status))).length;
+    return componentData().filter((item) => isVisibleInCurrent(normalizeStatus(item.status))).length;
   }
 
   function passesStatusFilter(item) {
@@ -509,11 +517,14 @@
     const componentCounts = {};
     let last90Count = 0;
     let datedCount = 0;
+    const items = componentData();
 
     rfcData.forEach((item) => {
+      componentCounts[item.component] = (componentCounts[item.component] || 0) + 1;
+    });
+    items.forEach((item) => {
       const statusKey = normalizeStatus(item.status);
       statusCounts[statusKey] = (statusCounts[statusKey] || 0) + 1;
-      componentCounts[item.component] = (componentCounts[item.component] || 0) + 1;
       if (parseDate(item.updated)) {
         datedCount += 1;
         if (isWithinDays(item.updated, 90)) {
@@ -523,13 +534,13 @@
     });
     statusCounts.current = currentTotal();
 
-    updateChipGroup("status-chips", "status", statusCounts, rfcData.length);
+    updateChipGroup("status-chips", "status", statusCounts, items.length);
     updateChipGroup("component-chips", "component", componentCounts, rfcData.length);
     updateChipGroup(
       "date-chips",
       "date",
       { latest: Math.min(20, datedCount), last90: last90Count },
-      rfcData.length
+      items.length
     );
   }
 
@@ -592,14 +603,70 @@
     return sorted;
   }
 
+  // Set from the manifest when the index is sharded (`gen_rfc_index.py --sharded`).
+  let manifest = null;
+  const requestedShards = new Set();
+  let pendingShards = 0;
+
+  let searchIndexUrl = `${rootPrefix}rfc-search.json`;
+  let searchIndex = null;
+  let searchIndexRequested = false;
+
+  function loadSearchIndex() {
+    if (searchIndexRequested) return;
+    searchIndexRequested = true;
+    fetchJson(searchIndexUrl)
+      .then((index) => {
+        searchIndex = index;
+        if (searchInput.value) render();
+      })
+      .catch((err) => {
+        // Optional: without it the search only matches the table columns.
+        console.warn(err);
+      });
+  }
+
+  function lowerBound(terms, value) {
+    let lo = 0;
+    let hi = terms.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (terms[mid] < value) {
+        lo = mid + 1;
+      } else {
+        hi = mid;
+      }
+    }
+    return lo;
+  }
+
+  // Paths of the specs whose title, headings or metadata contain a word
+  // starting with every word of the query, or null if the index is not loaded.
+  function searchPaths(query) {
+    const words = query.match(/[a-z0-9]+/g);
+    if (!searchIndex || !words) return null;
+    const { terms, postings, docs } = searchIndex;
+    let matches = null;
+    for (const word of words) {
+      const found = new Set();
+      for (let i = lowerBound(terms, word); i < terms.length && terms[i].startsWith(word); i += 1) {
+        postings[i].forEach((doc) => found.add(doc));
+      }
+      matches = matches ? new Set([...matches].filter((doc) => found.has(doc))) : found;
+      if (!matches.size) break;
+    }
+    return new Set([...matches].map((doc) => docs[doc]));
+  }
+
   function render() {
     const query = (searchInput.value || "").toLowerCase();
+    const indexed = query ? searchPaths(query) : null;
     let filtered = rfcData.filter((item) => {
       const statusOk = passesStatusFilter(item);
-      const componentOk = componentFilter === "all" || item.component === componentFilter;
+      const componentOk = inComponent(item);
       const dateOk = passesDateFilter(item);
       const text = `${item.slug} ${item.title} ${item.component} ${item.status} ${item.category}`.toLowerCase();
-      const textOk = !query || text.includes(query);
+      const textOk = !query || text.includes(query) || (indexed !== null && indexed.has(item.path));
       return statusOk && componentOk && dateOk && textOk;
     });
 
@@ -617,12 +684,16 @@
         })
         .slice(0, 20);
     }
-    const totalForCount = statusFilter === "current" ? currentTotal() : rfcData.length;
-    updateResultsCount(sorted.length, totalForCount);
+    const totalForCount = statusFilter === "current" ? currentTotal() : componentData().length;
+    if (pendingShards) {
+      resultsCount.textContent = "Loading RFC index...";
+    } else {
+      updateResultsCount(sorted.length, totalForCount);
+    }
     updateHeaderIndicators();
     tbody.innerHTML = "";
 
-    if (!sorted.length) {
+    if (!sorted.length && !pendingShards) {
       const tr = document.createElement("tr");
       tr.innerHTML = `<td colspan="${headers.length}">No LIPs match your filters.</td>`;
       tbody.appendChild(tr);
@@ -645,7 +716,11 @@
     });
   }
 
-  searchInput.addEventListener("input", render);
+  searchInput.addEventListener("focus", loadSearchIndex, { once: true });
+  searchInput.addEventListener("input", () => {
+    loadSearchIndex();
+    render();
+  });
 
   const statusChips = document.getElementById("status-chips");
   if (statusChips) {
@@ -671,6 +746,8 @@
       document.querySelectorAll("#component-chips .chip").forEach((chip) => {
         chip.classList.toggle("active", chip.dataset.component === componentFilter);
       });
+      loadShards();
+      updateChipCounts();
       render();
     });
   }
@@ -687,17 +764,66 @@
     });
   }
 
-  resultsCount.textContent = "Loading RFC index...";
-  fetch(`${rootPrefix}rfc-index.json`)
-    .then((resp) => {
+  function fetchJson(url) {
+    return fetch(url).then((resp) => {
       if (!resp.ok) throw new Error(resp.statusText);
       return resp.json();
-    })
-    .then((data) => {
-      rfcData = componentScope ? data.filter((item) => item.component === componentScope) : data;
-      updateChipCounts();
-      render();
-    })
+    });
+  }
+
+  // Fetch the shards of the components the page and the component filter
+  // show that have not been requested yet, rendering each as it arrives.
+  function loadShards() {
+    if (!manifest) return;
+    Object.keys(manifest.components)
+      .filter((component) => !componentScope || component === componentScope)
+      .filter((component) => componentFilter === "all" || component === componentFilter)
+      .filter((component) => !requestedShards.has(component))
+      .forEach((component) => {
+        requestedShards.add(component);
+        pendingShards += 1;
+        fetchJson(`${rootPrefix}rfc-index/${manifest.components[component].shard}`)
+          .then((rows) => {
+            pendingShards -= 1;
+            rfcData = rfcData.concat(rows.map((row) => {
+              const item = { component };
+              manifest.fields.forEach((field, i) => {
+                item[field] = row[i];
+              });
+              return item;
+            }));
+            updateChipCounts();
+            render();
+          })
+          .catch((err) => {
+            // Requested again the next time the filter selects it.
+            pendingShards -= 1;
+            requestedShards.delete(component);
+            console.error(err);
+            resultsCount.textContent = "Failed to load RFC index.";
+          });
+      });
+  }
+
+  function loadManifest(data) {
+    manifest = data;
+    if (manifest.search) {
+      searchIndexUrl = `${rootPrefix}rfc-index/${manifest.search}`;
+    }
+    loadShards();
+  }
+
+  function loadIndex(data) {
+    rfcData = componentScope ? data.filter((item) => item.component === componentScope) : data;
+    updateChipCounts();
+    render();
+  }
+
+  resultsCount.textContent = "Loading RFC index...";
+  // A list of entries, or with `gen_rfc_index.py --sharded` a manifest of
+  // per-component shards.
+  fetchJson(`${rootPrefix}rfc-index.json`)
+    .then((data) => (Array.isArray(data) ? loadIndex(data) : loadManifest(data)))
     .catch((err) => {
       console.error(err);
       resultsCount.textContent = "Failed to load RFC index.";
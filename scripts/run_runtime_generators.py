@@ -1,33 +1,374 @@
 #!/usr/bin/env python3
 """
-Run all generators in sequence.
+Run all generators, each in its own process.
+
+Every generator declares what it reads and writes. A generator waits only
+for the earlier ones whose writes overlap its reads or writes (or whose
+reads overlap its writes), so independent generators run at the same time
+and the result matches a sequential run. Each generator's output is
+printed live, every line prefixed with the generator's name. The first
+failure stops the others and its exit code is returned.
+
+With --cache, a generator is skipped when nothing it reads or writes, nor
+its code, changed since it last ran (see build_cache.py).
+
+With --profile, each generator runs under instrument.py and a trace of
+the whole build is written next to the per-generator cProfile dumps.
 """
 from __future__ import annotations
 
+import argparse
+import json
+import os
+import queue
 import subprocess
 import sys
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from build_cache import (
+    DEFAULT_STAGE_CACHE,
+    DOC_BODIES,
+    DOC_HEADERS,
+    DOC_TIMELINES,
+    GIT_HEAD,
+    StageCache,
+)
 
 ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PROFILE_DIR = ROOT / ".cache" / "profile"
+
+
+@dataclass(frozen=True)
+class Script:
+    path: str
+    reads: FrozenSet[str]
+    writes: FrozenSet[str]
+    args: Tuple[str, ...] = ()
+
+
 SCRIPTS = [
-    "scripts/validate_metadata.py",
-    "scripts/gen_history.py",
-    "scripts/gen_rfc_index.py",
-    "scripts/gen_summary.py",
+    Script(
+        "scripts/validate_metadata.py",
+        reads=frozenset({DOC_HEADERS}),
+        writes=frozenset({DOC_HEADERS}),
+    ),
+    # Rewrites files in place atomically, so the generators reading the
+    # other parts of them can run alongside.
+    Script(
+        "scripts/gen_history.py",
+        reads=frozenset({DOC_HEADERS, GIT_HEAD}),
+        writes=frozenset({DOC_TIMELINES}),
+    ),
+    Script(
+        "scripts/gen_rfc_index.py",
+        reads=frozenset({DOC_HEADERS, DOC_BODIES, GIT_HEAD}),
+        writes=frozenset({"docs/rfc-index.json", "docs/rfc-search.json", "docs/rfc-index/"}),
+        args=("--sharded",),
+    ),
+    Script(
+        "scripts/gen_summary.py",
+        reads=frozenset({DOC_HEADERS}),
+        writes=frozenset({"docs/SUMMARY.md"}),
+    ),
 ]
 
 
-def run(script: str) -> None:
-    path = ROOT / script
+def dependencies(scripts: List[Script]) -> Dict[str, Set[str]]:
+    """Map each script to the earlier scripts it must wait for."""
+    deps: Dict[str, Set[str]] = {}
+    for idx, script in enumerate(scripts):
+        deps[script.path] = {
+            earlier.path
+            for earlier in scripts[:idx]
+            if earlier.writes & (script.reads | script.writes) or earlier.reads & script.writes
+        }
+    return deps
+
+
+class Profile:
+    """Start and end times of each generator, merged with what instrument.py recorded."""
+
+    def __init__(self, out_dir: Path, trace_format: str) -> None:
+        self.out_dir = out_dir
+        self.trace_format = trace_format
+        self.start = time.time()
+        self.times: Dict[str, Tuple[float, float]] = {}
+
+    def command(self, script: Script) -> List[str]:
+        return [sys.executable, str(ROOT / "scripts" / "instrument.py"), "--out", str(self.out_dir), str(ROOT / script.path), *script.args]
+
+    def begin(self, script: Script) -> None:
+        # Left over from an earlier run if this one is stopped early.
+        (self.out_dir / f"{Path(script.path).stem}.json").unlink(missing_ok=True)
+        self.times[script.path] = (time.time(), 0.0)
+
+    def end(self, script: Script) -> None:
+        self.times[script.path] = (self.times[script.path][0], time.time())
+
+    def stages(self, scripts: List[Script]) -> List[Dict[str, Any]]:
+        stages = []
+        for script in scripts:
+            if script.path not in self.times or not self.times[script.path][1]:
+                continue
+            begin, end = self.times[script.path]
+            name = Path(script.path).stem
+            summary_path = self.out_dir / f"{name}.json"
+            stage: Dict[str, Any] = json.loads(summary_path.read_text(encoding="utf-8")) if summary_path.exists() else {"name": name}
+            calls = stage.pop("git_calls", [])
+            by_command: Dict[str, Dict[str, Any]] = {}
+            for call in calls:
+                totals = by_command.setdefault(call["command"], {"calls": 0, "seconds": 0.0})
+                totals["calls"] += 1
+                totals["seconds"] += call["seconds"]
+            stage.setdefault("git", {})["by_command"] = by_command
+            stage.update(
+                script=script.path,
+                start=begin - self.start,
+                wall_seconds=end - begin,
+                profile=f"{name}.prof",
+                git_events=calls,
+            )
+            stages.append(stage)
+        return stages
+
+    def chrome_trace(self, stages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Trace-event format, for chrome://tracing or Perfetto: one process per generator."""
+        events: List[Dict[str, Any]] = []
+        for pid, stage in enumerate(stages, start=1):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": stage["name"]}})
+            args = {key: value for key, value in stage.items() if key not in ("git_events", "name")}
+            events.append({
+                "name": stage["name"],
+                "ph": "X",
+                "pid": pid,
+                "tid": 0,
+                "ts": stage["start"] * 1e6,
+                "dur": stage["wall_seconds"] * 1e6,
+                "args": args,
+            })
+            for call in stage["git_events"]:
+                events.append({
+                    "name": call["command"],
+                    "cat": "git",
+                    "ph": "X",
+                    "pid": pid,
+                    "tid": call["thread"],
+                    "ts": (call["start"] - self.start) * 1e6,
+                    "dur": call["seconds"] * 1e6,
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, scripts: List[Script]) -> Path:
+        stages = self.stages(scripts)
+        for stage in stages:
+            line = f"[PROFILE] {stage['name']}: {stage['wall_seconds']:.2f}s wall"
+            if "cpu_seconds" in stage:
+                line += f", {stage['cpu_seconds']:.2f}s CPU (+{stage['child_cpu_seconds']:.2f}s in git)"
+            if "git" in stage and "calls" in stage["git"]:
+                line += f", {stage['git']['calls']} git calls ({stage['git']['seconds']:.2f}s)"
+            if "peak_rss_bytes" in stage:
+                line += f", peak {stage['peak_rss_bytes'] / 2**20:.0f} MiB"
+            print(line)
+
+        if self.trace_format == "chrome":
+            data = self.chrome_trace(stages)
+        else:
+            for stage in stages:
+                del stage["git_events"]
+            data = {"wall_seconds": time.time() - self.start, "stages": stages}
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        trace_path = self.out_dir / "trace.json"
+        trace_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        print(f"[INFO] Wrote profile to {trace_path}")
+        return trace_path
+
+
+def command(script: Script, profile: Optional[Profile] = None) -> List[str]:
+    if profile is not None:
+        return profile.command(script)
+    return [sys.executable, str(ROOT / script.path), *script.args]
+
+
+def stage_fingerprint(script: Script, cache: StageCache) -> str:
+    return cache.fingerprint(ROOT / script.path, list(script.args), script.reads | script.writes)
+
+
+def skip(script: Script, cache: Optional[StageCache]) -> bool:
+    return cache is not None and cache.fresh(script.path, stage_fingerprint(script, cache))
+
+
+def finish(script: Script, cache: Optional[StageCache], returncode: int) -> None:
+    if cache is not None:
+        # What it reads is unchanged (nothing writing it runs alongside), so
+        # only its outputs are hashed again.
+        cache.changed(script.writes)
+        cache.record(script.path, stage_fingerprint(script, cache) if returncode == 0 else None)
+
+
+def run(script: Script, profile: Optional[Profile] = None, cache: Optional[StageCache] = None) -> None:
+    path = ROOT / script.path
+    if skip(script, cache):
+        print(f"[INFO] Skipping {path} (inputs unchanged)")
+        return
     print(f"[INFO] Running {path}")
-    result = subprocess.run([sys.executable, str(path)], cwd=ROOT)
+    if profile is not None:
+        profile.begin(script)
+    result = subprocess.run(command(script, profile), cwd=ROOT)
+    if profile is not None:
+        profile.end(script)
+    finish(script, cache, result.returncode)
     if result.returncode != 0:
         raise SystemExit(result.returncode)
 
 
-def main() -> None:
-    for script in SCRIPTS:
-        run(script)
+class Scheduler:
+    def __init__(
+        self,
+        scripts: List[Script],
+        jobs: int,
+        profile: Optional[Profile] = None,
+        cache: Optional[StageCache] = None,
+    ) -> None:
+        self.scripts = scripts
+        self.jobs = jobs
+        self.profile = profile
+        self.cache = cache
+        self.deps = dependencies(scripts)
+        self.procs: Dict[str, subprocess.Popen] = {}
+        self.finished: "queue.Queue[Tuple[Script, int]]" = queue.Queue()
+        self.print_lock = threading.Lock()
+
+    def emit(self, script: Script, line: bytes) -> None:
+        """Print a line of `script`'s output as it comes, prefixed with its name."""
+        prefix = f"[{Path(script.path).stem}] ".encode("utf-8")
+        with self.print_lock:
+            sys.stdout.buffer.write(prefix + line.rstrip(b"\r\n") + b"\n")
+            sys.stdout.buffer.flush()
+
+    def start(self, script: Script) -> None:
+        if self.profile is not None:
+            self.profile.begin(script)
+        print(f"[INFO] Running {ROOT / script.path}", flush=True)
+        proc = subprocess.Popen(
+            command(script, self.profile),
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Line by line, rather than in blocks once the pipe buffer fills.
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
+        )
+        self.procs[script.path] = proc
+
+        def wait() -> None:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                self.emit(script, line)
+            proc.wait()
+            if self.profile is not None:
+                self.profile.end(script)
+            self.finished.put((script, proc.returncode))
+
+        threading.Thread(target=wait, daemon=True).start()
+
+    def stop(self) -> None:
+        for proc in self.procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs.values():
+            proc.wait()
+
+    def run(self) -> None:
+        pending = list(self.scripts)
+        done: Set[str] = set()
+        running = 0
+        while pending or running:
+            for script in list(pending):
+                if running >= self.jobs:
+                    break
+                if self.deps[script.path] <= done:
+                    pending.remove(script)
+                    if skip(script, self.cache):
+                        done.add(script.path)
+                        print(f"[INFO] Skipping {ROOT / script.path} (inputs unchanged)", flush=True)
+                        continue
+                    self.start(script)
+                    running += 1
+            if not running:
+                continue
+
+            script, returncode = self.finished.get()
+            running -= 1
+            finish(script, self.cache, returncode)
+            if returncode != 0:
+                self.stop()
+                print(f"[ERROR] {ROOT / script.path} failed with exit code {returncode}", flush=True)
+                raise SystemExit(returncode)
+            done.add(script.path)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the docs generators.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=len(SCRIPTS),
+        help="Maximum number of generators running at once (default: %(default)s). "
+        "With 1 they run in sequence and their output is not prefixed.",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_STAGE_CACHE,
+        help=(
+            "Keep a fingerprint of each generator's code, inputs and outputs at this path "
+            f"(default: {DEFAULT_STAGE_CACHE.relative_to(ROOT)}) and skip generators "
+            "whose fingerprint is unchanged."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_PROFILE_DIR,
+        help=(
+            "Record per-generator wall and CPU time, git calls, file I/O and peak memory, and a "
+            "cProfile dump per generator, in this directory "
+            f"(default: {DEFAULT_PROFILE_DIR.relative_to(ROOT)})."
+        ),
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=["json", "chrome"],
+        default="json",
+        help="Format of the --profile trace.json: a summary per generator (default), "
+        "or Chrome trace events with one span per git call.",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    profile = Profile(args.profile.resolve(), args.trace_format) if args.profile else None
+    cache = StageCache(args.cache) if args.cache else None
+    try:
+        if args.jobs == 1:
+            for script in SCRIPTS:
+                run(script, profile, cache)
+        else:
+            Scheduler(SCRIPTS, args.jobs, profile, cache).run()
+    finally:
+        if cache is not None:
+            cache.save()
+        if profile is not None:
+            profile.write(SCRIPTS)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Shared parser for the header of a spec: its H1 title and the
+`| Field | Value |` metadata table near the top of the file.
+
+`scan_header()` stream-reads a file only up to the end of the metadata table
+(or the first HEADER_LINES lines when there is none), so callers that only
+need metadata never read the body. `parse_header()` applies the same rules
+to lines that are already in memory.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# The metadata table header must start within this many lines.
+HEADER_LINES = 140
+
+SEPARATOR_RE = re.compile(r"^\|\s*:?-{3,}:?\s*\|\s*:?-{3,}:?\s*\|$")
+ROW_RE = re.compile(r"^\|\s*([^|]+?)\s*\|\s*(.*?)\s*\|$")
+HEADER_RE = re.compile(r"^\|\s*field\s*\|\s*value\s*\|$", re.IGNORECASE)
+H1_RE = re.compile(r"^#\s+(.+)$")
+
+
+@dataclass
+class MetadataTable:
+    start: int
+    separator: int
+    end: int
+    # lowercase field -> (line index, field as written, value)
+    rows: Dict[str, Tuple[int, str, str]]
+
+
+@dataclass
+class SpecHeader:
+    # Lines read so far; the whole file only if `complete`.
+    lines: List[str]
+    complete: bool
+    title: Optional[str]
+    table: Optional[MetadataTable]
+
+    def meta(self) -> Dict[str, str]:
+        if not self.table:
+            return {}
+        return {key: value for key, (_, _, value) in self.table.rows.items()}
+
+
+def find_metadata_table(lines: List[str]) -> Optional[MetadataTable]:
+    max_scan = min(len(lines), HEADER_LINES)
+    for idx in range(max_scan - 1):
+        if not HEADER_RE.match(lines[idx].strip()):
+            continue
+        if not SEPARATOR_RE.match(lines[idx + 1].strip()):
+            continue
+
+        rows: Dict[str, Tuple[int, str, str]] = {}
+        row_idx = idx + 2
+        while row_idx < len(lines) and lines[row_idx].strip().startswith("|"):
+            raw = lines[row_idx].strip()
+            match = ROW_RE.match(raw)
+            if match:
+                key_display = match.group(1).strip()
+                key = key_display.lower()
+                value = match.group(2).strip()
+                if key not in rows:
+                    rows[key] = (row_idx, key_display, value)
+            row_idx += 1
+
+        return MetadataTable(start=idx, separator=idx + 1, end=row_idx, rows=rows)
+    return None
+
+
+def find_title(lines: Iterable[str]) -> Optional[str]:
+    for line in lines:
+        match = H1_RE.match(line)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def parse_header(lines: List[str], complete: bool = True) -> SpecHeader:
+    table = find_metadata_table(lines)
+    return SpecHeader(
+        lines=lines,
+        complete=complete,
+        # Only the lines scan_header() reads, so both agree.
+        title=find_title(lines[:table.end] if table else lines[:HEADER_LINES]),
+        table=table,
+    )
+
+
+def scan_header(path: Path) -> SpecHeader:
+    """
+    Read `path` up to the end of its metadata table. Lines are split the
+    way `read_text(errors="ignore").splitlines()` splits them, so line
+    numbers match a full read.
+    """
+    lines: List[str] = []
+    with path.open(encoding="utf-8", errors="ignore") as handle:
+        for line in handle:
+            lines.extend(line.splitlines())
+            if len(lines) >= HEADER_LINES:
+                break
+        else:
+            return parse_header(lines)
+
+        table = find_metadata_table(lines)
+        if table is None or table.end < len(lines):
+            return parse_header(lines, complete=False)
+
+        # The table runs past the lines read so far; read the rest of it.
+        for line in handle:
+            parts = line.splitlines()
+            lines.extend(parts)
+            if any(not part.strip().startswith("|") for part in parts):
+                return parse_header(lines, complete=False)
+    return parse_header(lines)
@@ -5,17 +5,35 @@ Validate RFC metadata tables and auto-assign missing slugs.
 By default, this script writes fixes for missing/blank `Slug` values and
 returns non-zero on any validation issue.
 Use `--check` to run in read-only mode.
+
+`--changed-since REV` validates only the specs changed since REV, and
+given files only those files. Slug uniqueness and slug assignment still
+see every spec, through a registry of their metadata
+(.cache/slug-registry.json) that is brought up to date from `git diff`
+against the commit it was last saved at.
 """
 from __future__ import annotations
 
 import argparse
+import json
 import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import build_cache
+import instrument
+from spec_header import ROW_RE, SEPARATOR_RE, MetadataTable, find_metadata_table, scan_header
+
+if TYPE_CHECKING:
+    from corpus import Corpus
 
 ROOT = Path(__file__).resolve().parent.parent
 DOCS = ROOT / "docs"
+DEFAULT_REGISTRY = ROOT / ".cache" / "slug-registry.json"
+REGISTRY_VERSION = 1
 
 EXCLUDE_FILES = {"README.md", "SUMMARY.md", "about.md", "template.md"}
 # Fields required for draft and above; raw specs only need name + status.
@@ -31,27 +49,17 @@ ALLOWED_CATEGORIES = {
     "networking",
 }
 
-SEPARATOR_RE = re.compile(r"^\|\s*:?-{3,}:?\s*\|\s*:?-{3,}:?\s*\|$")
-ROW_RE = re.compile(r"^\|\s*([^|]+?)\s*\|\s*(.*?)\s*\|$")
-HEADER_RE = re.compile(r"^\|\s*field\s*\|\s*value\s*\|$", re.IGNORECASE)
 NUMERIC_RE = re.compile(r"^[1-9][0-9]*$")
 
 
-@dataclass
-class TableInfo:
-    start: int
-    separator: int
-    end: int
-    rows: Dict[str, Tuple[int, str, str]]
-
-
 @dataclass
 class DocInfo:
     path: Path
     rel: Path
     lines: List[str]
-    table: Optional[TableInfo]
+    table: Optional[MetadataTable]
     errors: List[str]
+    complete: bool = True
     assigned_slug: Optional[int] = None
 
     def meta(self) -> Dict[str, str]:
@@ -60,59 +68,70 @@ class DocInfo:
         return {k: v for k, (_, _, v) in self.table.rows.items()}
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Validate RFC metadata.")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        metavar="FILE",
+        help="Only validate these specs (default: every spec under docs/).",
+    )
     parser.add_argument(
         "--check",
         action="store_true",
         help="Read-only mode; do not write missing slugs.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes reading and validating files (default: 1).",
+    )
+    parser.add_argument(
+        "--changed-since",
+        metavar="REV",
+        help="Only validate specs changed since REV (committed, staged, unstaged or untracked).",
+    )
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY,
+        help="Metadata registry used with --changed-since or FILE (default: .cache/slug-registry.json).",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.files and args.changed_since:
+        parser.error("FILE and --changed-since cannot be combined")
+    return args
 
 
-def discover_docs() -> List[Path]:
+def is_doc(path: Path) -> bool:
+    return path.suffix == ".md" and path.name not in EXCLUDE_FILES
+
+
+def discover_docs(corpus: Optional[Corpus] = None) -> List[Path]:
     files = []
-    for path in DOCS.rglob("*.md"):
-        if path.name in EXCLUDE_FILES:
+    for path in (doc.path for doc in corpus) if corpus is not None else DOCS.rglob("*.md"):
+        if not is_doc(path):
             continue
         files.append(path)
     return sorted(files)
 
 
-def find_metadata_table(lines: List[str]) -> Optional[TableInfo]:
-    max_scan = min(len(lines), 140)
-    for idx in range(max_scan - 1):
-        if not HEADER_RE.match(lines[idx].strip()):
-            continue
-        if not SEPARATOR_RE.match(lines[idx + 1].strip()):
-            continue
-
-        rows: Dict[str, Tuple[int, str, str]] = {}
-        row_idx = idx + 2
-        while row_idx < len(lines) and lines[row_idx].strip().startswith("|"):
-            raw = lines[row_idx].strip()
-            match = ROW_RE.match(raw)
-            if match:
-                key_display = match.group(1).strip()
-                key = key_display.lower()
-                value = match.group(2).strip()
-                if key not in rows:
-                    rows[key] = (row_idx, key_display, value)
-            row_idx += 1
-
-        return TableInfo(start=idx, separator=idx + 1, end=row_idx, rows=rows)
-    return None
-
-
-def read_doc(path: Path) -> DocInfo:
-    lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
-    table = find_metadata_table(lines)
+def read_doc(path: Path, corpus: Optional[Corpus] = None) -> DocInfo:
+    # Only the header is read; maybe_assign_slugs() loads the rest of a file
+    # before rewriting it.
+    cached = corpus.get(path) if corpus is not None else None
+    header = cached.header if cached is not None else scan_header(path)
     return DocInfo(
         path=path,
         rel=path.relative_to(ROOT),
-        lines=lines,
-        table=table,
+        lines=header.lines,
+        table=header.table,
         errors=[],
+        complete=header.complete,
     )
 
 
@@ -143,6 +162,14 @@ def assign_missing_slug(doc: DocInfo, slug: int) -> None:
     doc.assigned_slug = slug
 
 
+def registered_doc(rel: str, meta: Optional[Dict[str, str]]) -> DocInfo:
+    """A doc known only from the registry: its metadata, without its lines."""
+    table = None
+    if meta is not None:
+        table = MetadataTable(0, 1, 2, {key: (0, key, value) for key, value in meta.items()})
+    return DocInfo(path=ROOT / rel, rel=Path(rel), lines=[], table=table, errors=[])
+
+
 def collect_used_numeric_slugs(docs: List[DocInfo]) -> set[int]:
     used: set[int] = set()
     for doc in docs:
@@ -154,12 +181,15 @@ def collect_used_numeric_slugs(docs: List[DocInfo]) -> set[int]:
     return used
 
 
-def maybe_assign_slugs(docs: List[DocInfo], check_mode: bool) -> List[DocInfo]:
+def maybe_assign_slugs(
+    docs: List[DocInfo], check_mode: bool, others: Optional[List[DocInfo]] = None
+) -> List[DocInfo]:
+    """Assign slugs in `docs`, avoiding those already used there or in `others`."""
     if check_mode:
         return []
 
     changed: List[DocInfo] = []
-    used = collect_used_numeric_slugs(docs)
+    used = collect_used_numeric_slugs(docs + (others or []))
     for doc in docs:
         if not doc.table:
             continue
@@ -171,6 +201,9 @@ def maybe_assign_slugs(docs: List[DocInfo], check_mode: bool) -> List[DocInfo]:
         status = meta.get("status", "").strip().lower()
         if status == "raw":
             continue
+        if not doc.complete:
+            doc.lines = doc.path.read_text(encoding="utf-8", errors="ignore").splitlines()
+            doc.complete = True
         free_slug = next_free_slug(used)
         assign_missing_slug(doc, free_slug)
         used.add(free_slug)
@@ -229,6 +262,28 @@ def validate_doc(doc: DocInfo) -> None:
             )
 
 
+def read_and_validate(path: Path) -> DocInfo:
+    doc = read_doc(path)
+    validate_doc(doc)
+    return doc
+
+
+def load_docs(paths: List[Path], jobs: int, corpus: Optional[Corpus] = None) -> List[DocInfo]:
+    """
+    Read and validate `paths` in order, with `jobs` processes when there is
+    no corpus already holding the headers. The checks that need every doc
+    run afterwards, on the merged list.
+    """
+    if jobs > 1 and corpus is None and len(paths) > 1:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(read_and_validate, paths, chunksize=chunksize))
+    docs = [read_doc(path, corpus) for path in paths]
+    for doc in docs:
+        validate_doc(doc)
+    return docs
+
+
 def validate_slug_uniqueness(docs: List[DocInfo]) -> List[str]:
     # Allow duplicated slugs in archived previous-version snapshots.
     slug_map: Dict[int, List[Path]] = {}
@@ -251,25 +306,147 @@ def validate_slug_uniqueness(docs: List[DocInfo]) -> List[str]:
     return errors
 
 
-def write_if_changed(doc: DocInfo) -> None:
-    text = "\n".join(doc.lines).rstrip() + "\n"
-    doc.path.write_text(text, encoding="utf-8")
+def run_git(args: List[str]) -> str:
+    cmd = ["git"] + args
+    with instrument.git_call(args):
+        result = subprocess.run(
+            cmd,
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+        )
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+    return result.stdout
+
+
+def changed_since(rev: str) -> List[str]:
+    """Specs whose working tree copy differs from `rev`, including new and removed ones."""
+    names = run_git(["diff", "--name-only", "--no-renames", "-z", rev, "--", "docs"]).split("\0")
+    names += run_git(["ls-files", "--others", "--exclude-standard", "-z", "--", "docs"]).split("\0")
+    return sorted({name for name in names if name and is_doc(Path(name))})
+
+
+class SlugRegistry:
+    """
+    The metadata of every spec, kept between runs so that --changed-since
+    only has to read the specs that changed.
+
+    It is saved with the commit it matches and the specs that differed from
+    that commit at the time; the next run re-reads those and the ones
+    `git diff` reports since, or everything when the file is missing, from
+    another version, or its commit is unknown (e.g. a shallow clone).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.commit: Optional[str] = None
+        self.dirty: List[str] = []
+        self.docs: Dict[str, Optional[Dict[str, str]]] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == REGISTRY_VERSION:
+            self.commit = data.get("commit")
+            self.dirty = data.get("dirty", [])
+            self.docs = data.get("docs", {})
+
+    def update(self, rel: str) -> None:
+        path = ROOT / rel
+        if path.is_file():
+            doc = read_doc(path)
+            self.docs[rel] = doc.meta() if doc.table else None
+        else:
+            self.docs.pop(rel, None)
+
+    def record(self, doc: DocInfo) -> None:
+        """Take in a spec this run rewrote, so it now differs from the commit."""
+        rel = doc.rel.as_posix()
+        self.docs[rel] = doc.meta()
+        if rel not in self.dirty:
+            self.dirty.append(rel)
+
+    def refresh(self) -> None:
+        head = run_git(["rev-parse", "HEAD"]).strip()
+        stale: Optional[List[str]] = None
+        if self.commit is not None:
+            try:
+                stale = changed_since(self.commit)
+            except subprocess.CalledProcessError:
+                stale = None
+        if stale is None:
+            self.docs = {}
+            stale = [path.relative_to(ROOT).as_posix() for path in discover_docs()]
+        for rel in sorted(set(stale) | set(self.dirty)):
+            self.update(rel)
+        self.commit = head
+        self.dirty = changed_since(head)
+
+    def others(self, skip: set) -> List[DocInfo]:
+        return [registered_doc(rel, meta) for rel, meta in self.docs.items() if rel not in skip]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": REGISTRY_VERSION,
+            "commit": self.commit,
+            "dirty": self.dirty,
+            "docs": dict(sorted(self.docs.items())),
+        }
+        build_cache.write_if_changed(self.path, json.dumps(data, indent=2).encode("utf-8"))
 
 
-def main() -> int:
-    args = parse_args()
-    docs = [read_doc(path) for path in discover_docs()]
+def write_if_changed(doc: DocInfo) -> None:
+    text = "\n".join(doc.lines).rstrip() + "\n"
+    build_cache.write_if_changed(doc.path, text.encode("utf-8"))
+
+
+def main(argv: Optional[List[str]] = None, corpus: Optional[Corpus] = None) -> int:
+    args = parse_args(argv)
+    registry = None
+    others: List[DocInfo] = []
+    if args.changed_since or args.files:
+        registry = SlugRegistry(args.registry)
+        try:
+            registry.refresh()
+            if args.changed_since:
+                paths = [ROOT / rel for rel in changed_since(args.changed_since) if (ROOT / rel).is_file()]
+            else:
+                paths = sorted(
+                    {
+                        path.resolve()
+                        for path in args.files
+                        if DOCS in path.resolve().parents and is_doc(path) and path.is_file()
+                    }
+                )
+        except subprocess.CalledProcessError as exc:
+            print(f"[ERROR] {' '.join(exc.cmd)} failed: {exc.stderr.strip()}")
+            return 1
+        others = registry.others({path.relative_to(ROOT).as_posix() for path in paths})
+    else:
+        paths = discover_docs(corpus)
+    docs = load_docs(paths, args.jobs, corpus)
 
-    changed = maybe_assign_slugs(docs, check_mode=args.check)
-    for doc in docs:
+    changed = maybe_assign_slugs(docs, check_mode=args.check, others=others)
+    # The assigned slugs are validated like the ones already there.
+    for doc in changed:
+        doc.errors = []
         validate_doc(doc)
 
-    global_errors = validate_slug_uniqueness(docs)
+    global_errors = validate_slug_uniqueness(sorted(docs + others, key=lambda doc: doc.path))
 
     if changed:
         for doc in changed:
             write_if_changed(doc)
+            if corpus is not None:
+                corpus.written(doc.path)
             print(f"[FIX] Assigned slug {doc.assigned_slug} in {doc.rel}")
+            if registry is not None:
+                registry.record(doc)
+    if registry is not None:
+        registry.save()
 
     error_count = len(global_errors)
     for doc in docs:
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Watch docs/ and rerun only the generators a change affects, e.g. while
+`mdbook serve` is running (see `make serve`).
+
+Changes are picked up with inotify where available, by polling otherwise,
+and collected until the tree has been quiet for --debounce seconds. Each
+batch of changed specs then reruns, on just those specs:
+
+- validate_metadata.py, for any added or edited spec (it assigns slugs);
+- gen_history.py, for the added or edited specs without a timeline that
+  are tracked by git;
+- gen_rfc_index.py --cache --sharded, which updates their entries in the
+  existing index;
+- gen_summary.py, when a spec was added or removed or its H1 changed.
+
+Timelines and last-updated dates of the other specs follow git commits
+rather than edits, so they are refreshed by the next full run of
+run_runtime_generators.py.
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import spec_header
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "docs"
+
+# Written by the generators; changes to them never trigger a rebuild.
+OUTPUTS = {DOCS / "SUMMARY.md", DOCS / "rfc-index.json", DOCS / "rfc-search.json"}
+OUTPUT_DIRS = {DOCS / "rfc-index"}
+TIMELINE_START = "<!-- timeline:start -->"
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_watched(path: Path) -> bool:
+    if path.suffix != ".md" or path in OUTPUTS:
+        return False
+    return not any(parent in OUTPUT_DIRS for parent in path.parents)
+
+
+class PollingWatcher:
+    """Compare the size and mtime of every Markdown file every `interval` seconds."""
+
+    def __init__(self, root: Path, interval: float) -> None:
+        self.root = root
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for path in self.root.rglob("*.md"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float) -> Set[Path]:
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(min(self.interval, max(deadline - time.monotonic(), 0)))
+            current = self.scan()
+            changed = {
+                path
+                for path in current.keys() | self.snapshot.keys()
+                if current.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = current
+            if changed or time.monotonic() >= deadline:
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify through libc, with a watch on every directory under `root`."""
+
+    def __init__(self, root: Path) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, Path] = {}
+        self.add_tree(root)
+
+    def add_tree(self, root: Path) -> Set[Path]:
+        """Watch `root` and the directories below it; return the files already there."""
+        found: Set[Path] = set()
+        for dirpath, _, filenames in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dirpath}")
+            self.dirs[wd] = Path(dirpath)
+            found.update(Path(dirpath) / name for name in filenames)
+        return found
+
+    def wait(self, timeout: float) -> Set[Path]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self.fd, 1 << 16)
+        changed: Set[Path] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; report everything.
+                for directory in set(self.dirs.values()):
+                    changed.update(directory.glob("*.md"))
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self.add_tree(path))
+                else:
+                    changed.add(path)  # stands for every file that was below it
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def open_watcher(root: Path, poll: bool, interval: float):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as exc:
+            print(f"[WATCH] inotify unavailable ({exc}); polling every {interval}s", flush=True)
+    return PollingWatcher(root, interval)
+
+
+def batches(watcher, debounce: float, alive) -> Iterator[Set[Path]]:
+    """Yield the changed paths once no new change arrived for `debounce` seconds."""
+    while alive():
+        changed = watcher.wait(1.0)
+        if not changed:
+            continue
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+@dataclass
+class DocState:
+    digest: str
+    title: Optional[str]
+    has_timeline: bool
+
+
+def read_state(path: Path) -> Optional[DocState]:
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    text = data.decode("utf-8", errors="ignore")
+    header = spec_header.parse_header(text.splitlines())
+    return DocState(
+        digest=hashlib.sha256(data).hexdigest(),
+        title=header.title,
+        has_timeline=TIMELINE_START in text,
+    )
+
+
+def tracked(paths: List[Path]) -> List[Path]:
+    """The ones of `paths` git knows about; only they have a history to show."""
+    if not paths:
+        return []
+    result = subprocess.run(
+        ["git", "ls-files", "-z", "--"] + [str(path.relative_to(ROOT)) for path in paths],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    known = {ROOT / os.fsdecode(name) for name in result.stdout.split(b"\0") if name}
+    return [path for path in paths if path in known]
+
+
+def relative(paths: List[Path]) -> List[str]:
+    return [str(path.relative_to(ROOT)) for path in paths]
+
+
+def run_generator(script: str, args: List[str]) -> bool:
+    cmd = [sys.executable, str(ROOT / "scripts" / script)] + args
+    print(f"[WATCH] Running {script} {' '.join(args)}".rstrip(), flush=True)
+    result = subprocess.run(cmd, cwd=ROOT)
+    if result.returncode != 0:
+        print(f"[WATCH] {script} failed with exit code {result.returncode}", flush=True)
+        return False
+    return True
+
+
+class Regenerator:
+    def __init__(self) -> None:
+        self.states: Dict[Path, DocState] = {}
+        for path in DOCS.rglob("*.md"):
+            state = read_state(path) if is_watched(path) else None
+            if state is not None:
+                self.states[path] = state
+
+    def handle(self, changed: Set[Path]) -> None:
+        # A removed or renamed directory is reported once for everything below it.
+        for path in list(changed):
+            changed.update(known for known in self.states if path in known.parents)
+
+        added: List[Path] = []
+        edited: List[Path] = []
+        removed: List[Path] = []
+        retitled = False
+        for path in sorted(changed):
+            if not is_watched(path):
+                continue
+            old = self.states.get(path)
+            new = read_state(path)
+            if new is None:
+                if old is not None:
+                    removed.append(path)
+                    del self.states[path]
+                continue
+            # Unchanged contents, e.g. a generator's own rewrite seen again.
+            if old is not None and old.digest == new.digest:
+                continue
+            (edited if old is not None else added).append(path)
+            retitled |= old is None or old.title != new.title
+            self.states[path] = new
+
+        touched = added + edited
+        if not touched and not removed:
+            return
+        print(
+            f"[WATCH] {len(added)} added, {len(edited)} edited, {len(removed)} removed",
+            flush=True,
+        )
+
+        if touched and not run_generator("validate_metadata.py", relative(touched)):
+            return
+        needs_timeline = tracked([path for path in touched if not self.states[path].has_timeline])
+        if needs_timeline:
+            run_generator("gen_history.py", relative(needs_timeline))
+        run_generator("gen_rfc_index.py", ["--cache", "--sharded"] + relative(touched + removed))
+        if added or removed or retitled:
+            run_generator("gen_summary.py", relative(touched + removed))
+
+        # Record what the generators wrote, so their rewrites aren't handled
+        # as new edits.
+        for path in touched:
+            state = read_state(path)
+            if state is not None:
+                self.states[path] = state
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Rerun the affected generators whenever files under docs/ change.",
+        epilog="Anything after `--` is run as a command alongside, e.g. "
+        "`watch.py -- mdbook serve`; watching stops when it exits.",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds without further changes before regenerating (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll for changes instead of using inotify.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Polling interval in seconds (default: %(default)s).",
+    )
+    parser.add_argument("command", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.command and args.command[0] == "--":
+        args.command = args.command[1:]
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    regenerator = Regenerator()
+    watcher = open_watcher(DOCS, args.poll, args.interval)
+    child = subprocess.Popen(args.command, cwd=ROOT) if args.command else None
+    print(f"[WATCH] Watching {DOCS.relative_to(ROOT)}/ ({type(watcher).__name__})", flush=True)
+
+    def alive() -> bool:
+        return child is None or child.poll() is None
+
+    try:
+        for changed in batches(watcher, args.debounce, alive):
+            regenerator.handle(changed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    if child is not None:
+        if child.poll() is None:
+            child.terminate()
+            child.wait()
+        elif child.returncode:
+            raise SystemExit(child.returncode)
+
+
+if __name__ == "__main__":
+    main()